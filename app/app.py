@@ -1,73 +1,169 @@
 # app/app.py
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
+import asyncio
+import json
+import logging
+import math
 import os
+import re
+import threading
 import uuid
+import numpy as np
+from cachetools import TTLCache
 from dotenv import load_dotenv
 from app.utils.subtitle_parser import SubtitleParser
 from app.utils.question_generator import QuestionGenerator
 from app.utils.feedback_generator import FeedbackGenerator
-from app.models.video import Video
-from app.models.database import Database
+from app.utils.openai_client import acreate_completion, get_client
+from app.utils.json_provider import ORJSONProvider
+from app.models.video import Video, video_summary
+from app.models.database import get_db
 from app.models.question import Question
 import requests
-from openai import OpenAI
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger(__name__)
+
 try:
     from youtube_transcript_api import YouTubeTranscriptApi
 except ImportError:
-    print("youtube-transcript-api not installed. YouTube transcripts won't be available.")
-    print("Install with: pip install youtube-transcript-api")
+    log.warning("youtube-transcript-api not installed. YouTube transcripts won't be available. "
+                "Install with: pip install youtube-transcript-api")
     YouTubeTranscriptApi = None
 
+# youtube-transcript-api 1.x takes a requests session, which lets transcript
+# fetches reuse connections. Older versions only have get_transcript, which
+# opens a new session on every call
+youtube_transcript_api = None
+if YouTubeTranscriptApi is not None and hasattr(YouTubeTranscriptApi, 'fetch'):
+    youtube_transcript_api = YouTubeTranscriptApi(http_client=requests.Session())
+
+try:
+    from celery import Celery
+except ImportError:
+    Celery = None
+
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 CORS(app)
 
 # Initialize components
-db = Database()
+db = get_db()
 subtitle_parser = SubtitleParser()
 question_generator = QuestionGenerator()
 feedback_generator = FeedbackGenerator()
 
+# Long-running question generation can be offloaded to Celery workers
+# when a broker is configured
+celery = None
+if os.getenv('CELERY_BROKER_URL'):
+    if Celery is None:
+        log.warning("celery not installed. Background question generation won't be available. "
+                    "Install with: pip install celery redis")
+    else:
+        celery = Celery(
+            'video_learning_system',
+            broker=os.getenv('CELERY_BROKER_URL'),
+            backend=os.getenv('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
+        )
+
+# Matches youtube.com/watch?...v=<id> and youtu.be/<id> URLs, capturing the ID
+YOUTUBE_URL_PATTERN = re.compile(r'(?:youtube\.com/watch\?(?:[^&]*&)*v=|youtu\.be/)([A-Za-z0-9_-]{11})')
+
 def is_youtube_url(url):
     """Check if a URL is a YouTube URL"""
-    youtube_patterns = [
-        "youtube.com/watch",
-        "youtu.be/"
-    ]
-    return url and any(pattern in url for pattern in youtube_patterns)
+    return bool(url and YOUTUBE_URL_PATTERN.search(url))
 
 def extract_youtube_id(youtube_url):
     """Extract YouTube video ID from URL"""
-    youtube_id = None
+    match = YOUTUBE_URL_PATTERN.search(youtube_url or '')
+    return match.group(1) if match else None
+
+def is_youtube_video(video):
+    """Check if a stored video is a YouTube video, memoizing the result on the video"""
+    if 'is_youtube' not in video:
+        video['is_youtube'] = bool(is_youtube_url(video.get('file_path')))
+    return video['is_youtube']
+
+def get_youtube_id(video):
+    """Get the YouTube video ID of a stored video, memoizing the result on the video"""
+    if 'youtube_id' not in video:
+        video['youtube_id'] = extract_youtube_id(video.get('file_path')) if is_youtube_video(video) else None
+    return video['youtube_id']
+
+# Transcripts rarely change, so keep recently fetched ones for an hour
+_transcript_cache = TTLCache(maxsize=512, ttl=3600)
+_transcript_index_cache = TTLCache(maxsize=512, ttl=3600)
+_transcript_cache_lock = threading.Lock()
+
+# Timestamp lookup indexes of stored videos' subtitles, built on first use
+# rather than stored with the video
+_subtitle_index_cache = TTLCache(maxsize=512, ttl=3600)
+_subtitle_index_lock = threading.Lock()
+
+def get_youtube_transcript(youtube_id):
+    """Fetch the transcript of a YouTube video, reusing recently fetched transcripts"""
+    with _transcript_cache_lock:
+        transcript_list = _transcript_cache.get(youtube_id)
+    
+    if transcript_list is None:
+        if youtube_transcript_api is not None:
+            transcript_list = youtube_transcript_api.fetch(youtube_id).to_raw_data()
+        else:
+            transcript_list = YouTubeTranscriptApi.get_transcript(youtube_id)
+        with _transcript_cache_lock:
+            _transcript_cache[youtube_id] = transcript_list
+    
+    return transcript_list
+
+def transcript_to_segments(transcript_list):
+    """Convert YouTube transcript items to the subtitle segment format"""
+    return [
+        {'index': i + 1, 'text': item['text'], 'start_time': item['start'], 'end_time': item['start'] + item['duration']}
+        for i, item in enumerate(transcript_list)
+    ]
+
+def get_youtube_transcript_index(youtube_id):
+    """Get a timestamp lookup index for the transcript of a YouTube video"""
+    with _transcript_cache_lock:
+        index = _transcript_index_cache.get(youtube_id)
     
-    if 'youtube.com/watch' in youtube_url:
-        youtube_id = youtube_url.split('v=')[1].split('&')[0] if 'v=' in youtube_url else None
-    elif 'youtu.be/' in youtube_url:
-        youtube_id = youtube_url.split('youtu.be/')[1].split('?')[0]
+    if index is None:
+        index = subtitle_parser.build_index(transcript_to_segments(get_youtube_transcript(youtube_id)))
+        with _transcript_cache_lock:
+            _transcript_index_cache[youtube_id] = index
     
-    return youtube_id
+    return index
 
-def generate_unique_question_id(video_id, timestamp, sequence_number):
-    """Generate a unique question ID that includes a sequence number"""
-    return f"{video_id}_{timestamp}_{sequence_number}"
+def get_subtitle_index(video):
+    """Get a timestamp lookup index for the subtitle segments of a stored video"""
+    with _subtitle_index_lock:
+        index = _subtitle_index_cache.get(video['video_id'])
+    
+    if index is None:
+        index = subtitle_parser.build_index(video['subtitle_segments'])
+        with _subtitle_index_lock:
+            _subtitle_index_cache[video['video_id']] = index
+    
+    return index
 
 @app.route('/api/videos', methods=['GET'])
 def get_videos():
     """Get all videos"""
     videos = db.get_all_videos()
-    return jsonify(videos)
+    questions_counts = db.count_questions_by_video()
+    return jsonify([video_summary(video, questions_counts.get(video['video_id'], 0)) for video in videos])
 
 @app.route('/api/videos/<video_id>', methods=['GET'])
 def get_video(video_id):
     """Get a specific video by ID"""
     video = db.get_video_by_id(video_id)
     if video:
-        return jsonify(video)
+        return jsonify(video_summary(video, len(db.get_questions_for_video(video_id))))
     return jsonify({'error': 'Video not found'}), 404
 
 @app.route('/api/videos', methods=['POST'])
@@ -78,16 +174,21 @@ def add_video():
     # Create a new video object
     video_id = str(uuid.uuid4())
     
+    file_path = data.get('file_path', '')
+    is_youtube = bool(is_youtube_url(file_path))
+    
     video = Video(
         video_id=video_id,
         title=data.get('title', 'Untitled Video'),
-        file_path=data.get('file_path', ''),
+        file_path=file_path,
         subtitle_path=data.get('subtitle_path', None),
-        duration=data.get('duration', None)
+        duration=data.get('duration', None),
+        is_youtube=is_youtube,
+        youtube_id=extract_youtube_id(file_path) if is_youtube else None
     )
     
     # Parse subtitle file if provided and not a YouTube video
-    if video.subtitle_path and os.path.exists(video.subtitle_path) and not is_youtube_url(video.file_path):
+    if video.subtitle_path and os.path.exists(video.subtitle_path) and not video.is_youtube:
         try:
             # Parse subtitles
             segments = subtitle_parser.parse(video.subtitle_path)
@@ -100,9 +201,10 @@ def add_video():
             return jsonify({'error': f'Error parsing subtitles: {str(e)}'}), 400
     
     # Save to database
-    db.add_video(video.to_dict())
+    video_dict = video.to_dict()
+    db.add_video(video_dict)
     
-    return jsonify(video.to_dict()), 201
+    return jsonify(video_summary(video_dict)), 201
 
 def get_context_for_timestamp(video, timestamp):
     """Get relevant context from video segments near the timestamp"""
@@ -110,40 +212,28 @@ def get_context_for_timestamp(video, timestamp):
     timestamp = float(timestamp)  # Ensure timestamp is a float
     
     # For YouTube videos, try to get transcript segments
-    if is_youtube_url(video.get('file_path')):
+    if is_youtube_video(video):
         try:
             if YouTubeTranscriptApi is None:
                 raise ImportError("YouTube transcript API not installed")
                 
-            youtube_id = extract_youtube_id(video.get('file_path'))
+            youtube_id = get_youtube_id(video)
             if not youtube_id:
                 raise ValueError("Could not extract YouTube video ID")
                 
-            transcript_list = YouTubeTranscriptApi.get_transcript(youtube_id)
+            index = get_youtube_transcript_index(youtube_id)
             
             # Find segments around the timestamp (30 seconds before and after)
-            for item in transcript_list:
-                item_start = item['start']
-                item_end = item['start'] + item['duration']
-                
-                if (abs(item_start - timestamp) < 30 or 
-                    abs(item_end - timestamp) < 30 or
-                    (item_start <= timestamp and item_end >= timestamp)):
-                    relevant_segments.append(item['text'])
+            relevant_segments = subtitle_parser.find_text_near(index, timestamp)
         except Exception as e:
-            print(f"Error getting YouTube transcript for context: {str(e)}")
+            log.error("Error getting YouTube transcript for context: %s", e)
     
     # For regular videos with subtitle segments
     elif video.get('subtitle_segments'):
-        for segment in video.get('subtitle_segments'):
-            segment_start = float(segment.get('start_time', 0))
-            segment_end = float(segment.get('end_time', 0))
-            
-            # Check if segment is within 30 seconds of the timestamp
-            if ((abs(segment_start - timestamp) < 30 or 
-                abs(segment_end - timestamp) < 30) or
-                (segment_start <= timestamp and segment_end >= timestamp)):
-                relevant_segments.append(segment.get('text', ''))
+        index = get_subtitle_index(video)
+        
+        # Find segments within 30 seconds of the timestamp
+        relevant_segments = subtitle_parser.find_text_near(index, timestamp)
     
     # If we couldn't find any segments, return a generic message
     if not relevant_segments:
@@ -154,16 +244,40 @@ def get_context_for_timestamp(video, timestamp):
     
     return context
 
+def stream_answer(messages):
+    """Yield an OpenAI answer as server-sent events while it is being generated
+    
+    Each event carries a JSON object with the next piece of the answer in
+    'content'. The stream ends with a [DONE] event, or an 'error' event if
+    the API call fails part way through.
+    """
+    try:
+        stream = get_client().chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            temperature=0.7,
+            stream=True
+        )
+        
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield f"data: {json.dumps({'content': chunk.choices[0].delta.content})}\n\n"
+        
+        yield "data: [DONE]\n\n"
+    except Exception as e:
+        log.error("Error streaming answer: %s", e)
+        yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
 @app.route('/api/videos/<video_id>/ask-question', methods=['POST'])
-def ask_question(video_id):
+async def ask_question(video_id):
     """Answer a question about a video at a specific timestamp"""
-    print(f"Received ask-question request for video {video_id}")
+    log.debug("Received ask-question request for video %s", video_id)
     data = request.json
     question = data.get('question')
     timestamp = data.get('timestamp')
     
-    print(f"Question: {question}")
-    print(f"Timestamp: {timestamp}")
+    log.debug("Question: %s", question)
+    log.debug("Timestamp: %s", timestamp)
     
     if not question:
         return jsonify({'error': 'Question is required'}), 400
@@ -172,14 +286,14 @@ def ask_question(video_id):
         # Get the video from the database
         video = db.get_video_by_id(video_id)
         if not video:
-            print(f"Video {video_id} not found")
+            log.debug("Video %s not found", video_id)
             return jsonify({'error': 'Video not found'}), 404
         
-        print(f"Found video: {video.get('title')}")
+        log.debug("Found video: %s", video.get('title'))
         
         # Get context from video segments near the timestamp
         context = get_context_for_timestamp(video, timestamp)
-        print(f"Context length: {len(context)}")
+        log.debug("Context length: %d", len(context))
         
         # Create a prompt for ChatGPT
         prompt = f"""
@@ -192,29 +306,34 @@ def ask_question(video_id):
         Provide a concise and helpful answer based only on the information in the context. If the context doesn't contain enough information to answer the question accurately, acknowledge this limitation in your response.
         """
         
-        print("Calling OpenAI API...")
-        # Call the OpenAI API using the existing client
-        response = client.chat.completions.create(
+        messages = [
+            {"role": "system", "content": "You are a helpful assistant answering questions about educational videos."},
+            {"role": "user", "content": prompt}
+        ]
+        
+        # Stream the answer as server-sent events when the client asks for it
+        if data.get('stream') or request.accept_mimetypes.best == 'text/event-stream':
+            log.debug("Streaming answer from OpenAI API...")
+            return Response(stream_with_context(stream_answer(messages)), mimetype='text/event-stream')
+        
+        log.debug("Calling OpenAI API...")
+        # Call the OpenAI API without blocking the event loop
+        response = await acreate_completion(
             model="gpt-4o-mini",  # Using the same model as your question generator
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant answering questions about educational videos."},
-                {"role": "user", "content": prompt}
-            ],
+            messages=messages,
             temperature=0.7
         )
         
         # Extract the answer
         answer = response.choices[0].message.content
-        print(f"Received answer from OpenAI: {answer[:100]}...")  # Print first 100 chars
+        log.debug("Received answer from OpenAI: %.100s...", answer)  # Log first 100 chars
         
         return jsonify({
             'answer': answer
         })
     
     except Exception as e:
-        print(f"Error answering question: {str(e)}")
-        import traceback
-        traceback.print_exc()  # Print the full stack trace
+        log.exception("Error answering question: %s", e)  # Logs the full stack trace
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/videos/<video_id>/subtitles', methods=['GET'])
@@ -225,33 +344,31 @@ def get_subtitles(video_id):
         return jsonify({'error': 'Video not found'}), 404
     
     # For YouTube videos, try to fetch transcript
-    if is_youtube_url(video.get('file_path')):
+    if is_youtube_video(video):
         try:
             if YouTubeTranscriptApi is None:
                 return jsonify({'error': 'YouTube transcript API not installed'}), 500
                 
-            youtube_id = extract_youtube_id(video.get('file_path'))
+            youtube_id = get_youtube_id(video)
             if not youtube_id:
                 return jsonify({'error': 'Could not extract YouTube video ID'}), 400
                 
-            transcript_list = YouTubeTranscriptApi.get_transcript(youtube_id)
-            segments = []
-            for i, item in enumerate(transcript_list):
-                segment = {
-                    'index': i + 1,
-                    'text': item['text'],
-                    'start_time': item['start'],
-                    'end_time': item['start'] + item['duration'],
-                    'start_time_str': str(item['start']),
-                    'end_time_str': str(item['start'] + item['duration'])
-                }
-                segments.append(segment)
+            segments = transcript_to_segments(get_youtube_transcript(youtube_id))
+            
+            # Only this response carries the string forms of the timestamps
+            for segment in segments:
+                segment['start_time_str'] = str(segment['start_time'])
+                segment['end_time_str'] = str(segment['end_time'])
             
             return jsonify(segments)
         except Exception as e:
             return jsonify({'error': f'Error fetching YouTube transcript: {str(e)}'}), 500
     
-    # For regular videos with subtitle files
+    # Segments parsed when the video was added are stored with it
+    if video.get('subtitle_segments'):
+        return jsonify(video['subtitle_segments'])
+    
+    # For regular videos added before segments were stored, parse the subtitle file
     if not video.get('subtitle_path'):
         return jsonify({'error': 'No subtitles available for this video'}), 404
     
@@ -261,15 +378,8 @@ def get_subtitles(video_id):
     except Exception as e:
         return jsonify({'error': f'Error parsing subtitles: {str(e)}'}), 500
 
-@app.route('/api/videos/<video_id>/generate-questions', methods=['POST'])
-def generate_questions(video_id):
-    """Generate questions for a video"""
-    video = db.get_video_by_id(video_id)
-    if not video:
-        return jsonify({'error': 'Video not found'}), 404
-    
-    # Get question type and count preferences from request data
-    data = request.json or {}
+def get_generation_options(data):
+    """Get the question type and count for a generation request, falling back to defaults"""
     question_type = data.get('question_type', 'multiple_choice')
     question_count = data.get('question_count', 10)
     
@@ -288,144 +398,110 @@ def generate_questions(video_id):
     if question_type not in valid_types:
         question_type = 'multiple_choice'  # Default to multiple choice
     
+    return question_type, question_count
+
+@app.route('/api/videos/<video_id>/generate-questions', methods=['POST'])
+async def generate_questions(video_id):
+    """Generate questions for a video"""
+    video = db.get_video_by_id(video_id)
+    if not video:
+        return jsonify({'error': 'Video not found'}), 404
+    
+    # Get question type and count preferences from request data
+    question_type, question_count = get_generation_options(request.json or {})
+    
+    result, status = await generate_questions_for_video(video, question_type, question_count)
+    return jsonify(result), status
+
+async def generate_chunk_questions(chunks, question_type, question_count, video_id):
+    """Generate question_count questions spread evenly over a video's chunks
+    
+    With fewer chunks than questions, each chunk is asked for several
+    questions in the same request, rather than being sent again
+    """
+    if not chunks:
+        return []
+    
+    if len(chunks) <= question_count:
+        # If we have fewer chunks than requested questions, use all of them
+        selected_indices = list(range(len(chunks)))
+    else:
+        # Spread the indices evenly from the first to the last chunk, which are
+        # already unique and in chronological order
+        selected_indices = np.unique(np.linspace(0, len(chunks) - 1, question_count).astype(int)).tolist()
+    
+    num_per_chunk = math.ceil(question_count / len(selected_indices))
+    generated_questions = await question_generator.agenerate_batch(
+        [chunks[i] for i in selected_indices], question_type, video_id, num_per_chunk
+    )
+    
+    # If we still need more questions, generate from chunks not used yet
+    if len(generated_questions) < question_count:
+        chosen = set(selected_indices)
+        unused_indices = [i for i in range(len(chunks)) if i not in chosen]
+        extra_chunks = [chunks[i] for i in unused_indices[:question_count - len(generated_questions)]]
+        generated_questions.extend(await question_generator.agenerate_batch(extra_chunks, question_type, video_id))
+    
+    # Identical chunks, like a repeated intro, get the same questions
+    unique_questions = []
+    seen_texts = set()
+    for question in generated_questions:
+        if question.get('question_text') not in seen_texts:
+            seen_texts.add(question.get('question_text'))
+            unique_questions.append(question)
+    
+    # Ensure we don't exceed the requested question count
+    return unique_questions[:question_count]
+
+async def generate_questions_for_video(video, question_type, question_count):
+    """Generate and store questions for a video, replacing any existing ones
+    
+    Returns the response body and HTTP status code
+    """
+    video_id = video.get('video_id')
+    
     # First, remove any existing questions for this video to avoid duplicates
     try:
         db.delete_questions_for_video(video_id)
     except Exception as e:
-        print(f"Error deleting existing questions: {str(e)}")
+        log.error("Error deleting existing questions: %s", e)
         # Continue even if deletion fails
     
-    # Counter for unique question IDs
-    question_counter = 0
-    
     # Check if this is a YouTube video
-    if is_youtube_url(video.get('file_path')):
+    if is_youtube_video(video):
         try:
             if YouTubeTranscriptApi is None:
                 raise ImportError("YouTube transcript API not installed")
                 
             # Extract YouTube video ID
-            youtube_id = extract_youtube_id(video.get('file_path'))
+            youtube_id = get_youtube_id(video)
             if not youtube_id:
                 raise ValueError("Could not extract YouTube video ID")
                 
             # Fetch transcript using youtube_transcript_api
-            transcript_list = YouTubeTranscriptApi.get_transcript(youtube_id)
-            
             # Convert transcript to subtitle segments format
-            segments = []
-            for i, item in enumerate(transcript_list):
-                segment = {
-                    'index': i + 1,
-                    'text': item['text'],
-                    'start_time': item['start'],
-                    'end_time': item['start'] + item['duration'],
-                    'start_time_str': str(item['start']),
-                    'end_time_str': str(item['start'] + item['duration'])
-                }
-                segments.append(segment)
+            segments = transcript_to_segments(get_youtube_transcript(youtube_id))
             
             # Group segments into topic chunks
             chunks = subtitle_parser.group_by_topic(segments)
             
             # Select evenly distributed chunks from video to generate questions
-            generated_questions = []
-            
-            # Select evenly distributed chunks to match the requested question count
-            if len(chunks) <= question_count:
-                # If we have fewer chunks than requested questions, use all of them
-                chunk_indices = list(range(len(chunks)))
-            else:
-                # Select evenly distributed chunks to match the requested question count
-                step = len(chunks) // question_count
-                chunk_indices = [i * step for i in range(question_count)]
-                # Make sure we have exactly question_count indices
-                if len(chunk_indices) < question_count:
-                    # Add additional indices from the middle or end of the video
-                    remaining = question_count - len(chunk_indices)
-                    middle_start = len(chunks) // 3
-                    for i in range(remaining):
-                        if middle_start + i < len(chunks) and middle_start + i not in chunk_indices:
-                            chunk_indices.append(middle_start + i)
-                        else:
-                            # Find any unused index
-                            for j in range(len(chunks)):
-                                if j not in chunk_indices:
-                                    chunk_indices.append(j)
-                                    break
-                
-                # Sort the indices to maintain chronological order
-                chunk_indices.sort()
-                # Trim to exact count if we somehow got more
-                chunk_indices = chunk_indices[:question_count]
+            generated_questions = await generate_chunk_questions(chunks, question_type, question_count, video_id)
             
-            # Generate questions for selected chunks
-            for idx in chunk_indices:
-                if idx < len(chunks):
-                    chunk = chunks[idx]
-                    questions = question_generator.generate_from_text(
-                        text=chunk.get('text'),
-                        video_id=video_id,
-                        timestamp_start=chunk.get('start_time'),
-                        timestamp_end=chunk.get('end_time'),
-                        num_questions=1,  # Generate 1 question per chunk
-                        question_type=question_type  # Pass the question type
-                    )
-                    
-                    # Ensure each question has a unique ID by appending the counter
-                    for q in questions:
-                        # Update the question_id to ensure uniqueness
-                        q['question_id'] = f"{video_id}_{chunk.get('start_time')}_{question_counter}"
-                        question_counter += 1
-                    
-                    generated_questions.extend(questions)
-                    
-                    # If we have enough questions, stop generating more
-                    if len(generated_questions) >= question_count:
-                        break
+            log.info("Generated %d questions for video %s", len(generated_questions), video_id)
             
-            # If we still need more questions, generate from other parts of the video
-            if len(generated_questions) < question_count and len(chunks) > 0:
-                remaining = question_count - len(generated_questions)
-                # Use chunks we haven't used yet
-                unused_indices = [i for i in range(len(chunks)) if i not in chunk_indices]
-                
-                for i in range(min(remaining, len(unused_indices))):
-                    idx = unused_indices[i]
-                    chunk = chunks[idx]
-                    questions = question_generator.generate_from_text(
-                        text=chunk.get('text'),
-                        video_id=video_id,
-                        timestamp_start=chunk.get('start_time'),
-                        timestamp_end=chunk.get('end_time'),
-                        num_questions=1,
-                        question_type=question_type
-                    )
-                    
-                    for q in questions:
-                        q['question_id'] = f"{video_id}_{chunk.get('start_time')}_{question_counter}"
-                        question_counter += 1
-                    
-                    generated_questions.extend(questions)
-            
-            # Ensure we don't exceed the requested question count
-            generated_questions = generated_questions[:question_count]
-            
-            # Print debug info
-            print(f"Generated {len(generated_questions)} questions for video {video_id}")
-            
-            # Save questions to database
+            # Save questions to database, which assigns their IDs
             db.add_questions(generated_questions)
             
-            return jsonify({
+            return {
                 'success': True,
                 'questions_generated': len(generated_questions),
                 'questions': generated_questions
-            })
+            }, 200
             
         except Exception as e:
             # If we can't get the transcript, fall back to generic questions
-            print(f"Error getting YouTube transcript: {str(e)}")
+            log.error("Error getting YouTube transcript: %s", e)
             
             title = video.get('title', '')
             
@@ -440,7 +516,6 @@ def generate_questions(video_id):
                 if question_type == 'multiple_choice' or (question_type == 'mixed' and i % 3 == 0):
                     question = {
                         "type": "multiple_choice",
-                        "question_id": f"{video_id}_{start_time}_{question_counter}",
                         "video_id": video_id,
                         "timestamp_start": start_time,
                         "timestamp_end": end_time,
@@ -457,7 +532,6 @@ def generate_questions(video_id):
                 elif question_type == 'fill_in_the_blank' or (question_type == 'mixed' and i % 3 == 1):
                     question = {
                         "type": "fill_in_the_blank",
-                        "question_id": f"{video_id}_{start_time}_{question_counter}",
                         "video_id": video_id,
                         "timestamp_start": start_time,
                         "timestamp_end": end_time,
@@ -468,7 +542,6 @@ def generate_questions(video_id):
                 else:  # short_answer or mixed (i % 3 == 2)
                     question = {
                         "type": "short_answer",
-                        "question_id": f"{video_id}_{start_time}_{question_counter}",
                         "video_id": video_id,
                         "timestamp_start": start_time,
                         "timestamp_end": end_time,
@@ -478,100 +551,75 @@ def generate_questions(video_id):
                         "explanation": f"A good answer should identify the main concepts of {title} discussed in this section."
                     }
                 
-                question_counter += 1
                 dummy_questions.append(question)
             
-            # Save questions to database
+            # Save questions to database, which assigns their IDs
             db.add_questions(dummy_questions)
             
-            return jsonify({
+            return {
                 'success': True,
                 'questions_generated': len(dummy_questions),
                 'questions': dummy_questions
-            })
+            }, 200
     
     # For regular videos with subtitle content
     if not video.get('topic_chunks'):
-        return jsonify({'error': 'No content chunks available for this video'}), 400
+        return {'error': 'No content chunks available for this video'}, 400
     
-    generated_questions = []
-    topic_chunks = video.get('topic_chunks')
+    generated_questions = await generate_chunk_questions(video.get('topic_chunks'), question_type, question_count, video_id)
     
-    # Determine how many chunks to use
-    if len(topic_chunks) <= question_count:
-        # If we have fewer chunks than requested questions, use all of them
-        selected_chunks = topic_chunks
-    else:
-        # Select evenly distributed chunks to match the requested question count
-        step = len(topic_chunks) // question_count
-        selected_indices = [i * step for i in range(question_count)]
-        # Ensure we don't exceed the array bounds
-        selected_indices = [i for i in selected_indices if i < len(topic_chunks)]
-        selected_chunks = [topic_chunks[i] for i in selected_indices]
-    
-    # Generate questions for each selected chunk
-    for chunk in selected_chunks:
-        # Generate questions for each chunk
-        questions = question_generator.generate_from_text(
-            text=chunk.get('text'),
-            video_id=video_id,
-            timestamp_start=chunk.get('start_time'),
-            timestamp_end=chunk.get('end_time'),
-            num_questions=1,  # Generate 1 question per chunk
-            question_type=question_type  # Pass the question type
-        )
-        
-        # Ensure each question has a unique ID
-        for q in questions:
-            q['question_id'] = f"{video_id}_{chunk.get('start_time')}_{question_counter}"
-            question_counter += 1
-        
-        generated_questions.extend(questions)
-        
-        # If we have enough questions, stop generating more
-        if len(generated_questions) >= question_count:
-            break
-    
-    # Ensure we have exactly the requested number of questions
-    if len(generated_questions) < question_count and len(topic_chunks) > 0:
-        # Generate additional questions from other chunks
-        remaining = question_count - len(generated_questions)
-        # Try to use different chunks
-        used_indices = set([topic_chunks.index(chunk) for chunk in selected_chunks if chunk in topic_chunks])
-        available_indices = [i for i in range(len(topic_chunks)) if i not in used_indices]
-        
-        # If we've used all chunks, just reuse some
-        if not available_indices:
-            available_indices = list(range(len(topic_chunks)))
-        
-        for i in range(min(remaining, len(available_indices))):
-            chunk = topic_chunks[available_indices[i]]
-            questions = question_generator.generate_from_text(
-                text=chunk.get('text'),
-                video_id=video_id,
-                timestamp_start=chunk.get('start_time'),
-                timestamp_end=chunk.get('end_time'),
-                num_questions=1,
-                question_type=question_type
-            )
-            
-            for q in questions:
-                q['question_id'] = f"{video_id}_{chunk.get('start_time')}_{question_counter}"
-                question_counter += 1
-            
-            generated_questions.extend(questions)
-    
-    # Ensure we don't exceed the requested question count
-    generated_questions = generated_questions[:question_count]
-    
-    # Save questions to database
+    # Save questions to database, which assigns their IDs
     db.add_questions(generated_questions)
     
-    return jsonify({
+    return {
         'success': True,
         'questions_generated': len(generated_questions),
         'questions': generated_questions
-    })
+    }, 200
+
+
+if celery is not None:
+    @celery.task(name='generate_questions')
+    def generate_questions_task(video_id, question_type, question_count):
+        """Celery task wrapping generate_questions_for_video"""
+        video = db.get_video_by_id(video_id)
+        if not video:
+            return {'status': 404, 'body': {'error': 'Video not found'}}
+        
+        result, status = asyncio.run(generate_questions_for_video(video, question_type, question_count))
+        return {'status': status, 'body': result}
+
+@app.route('/api/videos/<video_id>/generate-questions/async', methods=['POST'])
+def generate_questions_async(video_id):
+    """Queue question generation for a video on the Celery workers"""
+    if celery is None:
+        return jsonify({'error': 'Background question generation is not configured'}), 503
+    
+    if not db.get_video_by_id(video_id):
+        return jsonify({'error': 'Video not found'}), 404
+    
+    question_type, question_count = get_generation_options(request.json or {})
+    task = generate_questions_task.delay(video_id, question_type, question_count)
+    
+    return jsonify({'task_id': task.id}), 202
+
+@app.route('/api/tasks/<task_id>', methods=['GET'])
+def get_task(task_id):
+    """Get the state of a background task and its result once finished"""
+    if celery is None:
+        return jsonify({'error': 'Background question generation is not configured'}), 503
+    
+    task = celery.AsyncResult(task_id)
+    response = {'task_id': task_id, 'state': task.state}
+    
+    if task.successful():
+        result = task.result
+        response['status'] = result.get('status')
+        response['result'] = result.get('body')
+    elif task.failed():
+        response['error'] = str(task.result)
+    
+    return jsonify(response)
 
 @app.route('/api/videos/<video_id>/questions', methods=['GET'])
 def get_questions(video_id):
@@ -582,74 +630,104 @@ def get_questions(video_id):
 @app.route('/api/questions/<question_id>', methods=['GET'])
 def get_question(question_id):
     """Get a specific question by ID"""
-    all_questions = db.get_all_questions()
-    for question in all_questions:
-        if question.get('question_id') == question_id:
-            return jsonify(question)
+    question = db.get_question_by_id(question_id)
+    if question:
+        return jsonify(question)
     return jsonify({'error': 'Question not found'}), 404
 
 @app.route('/api/videos/<video_id>', methods=['DELETE'])
 def delete_video(video_id):
     """Delete a specific video and its questions"""
     try:
-        # Get the database
-        db = Database()
-        
         # First check if the video exists
         video = db.get_video_by_id(video_id)
         if not video:
             return jsonify({'error': 'Video not found'}), 404
         
-        # Delete all questions associated with this video
-        db.delete_questions_for_video(video_id)
-        
-        # Delete the video itself
-        # Add this method to your Database class
-        # This is implemented below
-        db.delete_video(video_id)
+        # Delete the video and all questions associated with it
+        db.delete_video_and_questions(video_id)
+        with _subtitle_index_lock:
+            _subtitle_index_cache.pop(video_id, None)
         
         return jsonify({'success': True, 'message': 'Video deleted successfully'})
     except Exception as e:
-        print(f"Error deleting video: {str(e)}")
+        log.error("Error deleting video: %s", e)
         return jsonify({'error': f'Failed to delete video: {str(e)}'}), 500
 
+def get_context_for_question(question):
+    """Get the transcript text a question was generated from"""
+    # Questions store the text of the chunk they were generated from
+    context_text = question.get('context_text')
+    
+    # Older questions don't, so find it in the video's subtitle segments
+    video = None if 'context_text' in question else db.get_video_by_id(question.get('video_id'))
+    if video and video.get('subtitle_segments'):
+        timestamp_start = question.get('timestamp_start')
+        timestamp_end = question.get('timestamp_end')
+        
+        # Find segments that overlap with the question timestamp
+        relevant_segments = []
+        for segment in video.get('subtitle_segments'):
+            if (segment.get('start_time') <= timestamp_end and 
+                segment.get('end_time') >= timestamp_start):
+                relevant_segments.append(segment.get('text'))
+        
+        if relevant_segments:
+            context_text = ' '.join(relevant_segments)
+    
+    return context_text
+
+def stream_feedback(question, user_answer, original_explanation, context_text):
+    """Yield the feedback on an answer as server-sent events
+    
+    The feedback text is sent in 'enhanced_feedback' as soon as it has been
+    generated, followed by the complete feedback in 'result' and a [DONE]
+    event.
+    """
+    for event in feedback_generator.stream_feedback(question, user_answer, original_explanation, context_text):
+        yield f"data: {json.dumps(event)}\n\n"
+    
+    yield "data: [DONE]\n\n"
+
 @app.route('/api/questions/<question_id>/verify', methods=['POST'])
 def verify_answer(question_id):
     """Verify if an answer is correct and provide feedback"""
-    data = request.json
-    user_answer = data.get('answer')
+    data = request.get_json(silent=True)
+    user_answer = data.get('answer') if isinstance(data, dict) else None
     
     if user_answer is None:  # Allow empty string answers but not missing ones
         return jsonify({'error': 'No answer provided'}), 400
     
+    # Answers are compared as text
+    if not isinstance(user_answer, str):
+        return jsonify({'error': 'Answer must be a string'}), 400
+    
     # Get the question
-    all_questions = db.get_all_questions()
-    question = None
-    for q in all_questions:
-        if q.get('question_id') == question_id:
-            question = q
-            break
+    question = db.get_question_by_id(question_id)
     
     if not question:
         return jsonify({'error': 'Question not found'}), 404
     
-    # Get context text from video
-    video_id = question.get('video_id')
-    timestamp_start = question.get('timestamp_start')
-    timestamp_end = question.get('timestamp_end')
-    
-    context_text = None
-    video = db.get_video_by_id(video_id)
-    if video and video.get('subtitle_segments'):
-        # Find segments that overlap with the question timestamp
-        relevant_segments = []
-        for segment in video.get('subtitle_segments'):
-            if (segment.get('start_time') <= timestamp_end and 
-                segment.get('end_time') >= timestamp_start):
-                relevant_segments.append(segment.get('text'))
+    # Multiple choice and fill in the blank answers are graded against the
+    # stored answer, so skip the API call unless enhanced feedback is asked for
+    if not data.get('enhanced'):
+        feedback_result = feedback_generator.generate_quick_feedback(
+            question=question,
+            user_answer=user_answer,
+            original_explanation=question.get('explanation')
+        )
         
-        if relevant_segments:
-            context_text = ' '.join(relevant_segments)
+        if feedback_result is not None:
+            return jsonify(feedback_result)
+    
+    context_text = get_context_for_question(question)
+    
+    # Stream the feedback as server-sent events when the client asks for it
+    if data.get('stream') or request.accept_mimetypes.best == 'text/event-stream':
+        return Response(
+            stream_with_context(stream_feedback(question, user_answer, question.get('explanation'), context_text)),
+            mimetype='text/event-stream'
+        )
     
     # Generate feedback based on the question type
     feedback_result = feedback_generator.generate_feedback(
@@ -661,5 +739,70 @@ def verify_answer(question_id):
     
     return jsonify(feedback_result)
 
+@app.route('/api/questions/verify', methods=['POST'])
+async def verify_answers():
+    """Verify the answers to a whole quiz, generating their feedback concurrently
+    
+    Expects {"answers": [{"question_id": ..., "answer": ...}], "enhanced": bool}
+    and returns the feedback for each answer in the same order
+    """
+    data = request.get_json(silent=True)
+    answers = data.get('answers') if isinstance(data, dict) else None
+    
+    if not isinstance(answers, list):
+        return jsonify({'error': 'No answers provided'}), 400
+    
+    # Malformed items reject the whole request, while missing answers and
+    # unknown questions only fail their own item
+    for i, answer in enumerate(answers):
+        if not isinstance(answer, dict):
+            return jsonify({'error': f'Answer {i} must be an object'}), 400
+        if not isinstance(answer.get('answer'), (str, type(None))):
+            return jsonify({'error': f'Answer {i} must be a string'}), 400
+        if isinstance(answer.get('question_id'), bool) or not isinstance(answer.get('question_id'), (str, int)):
+            return jsonify({'error': f'Answer {i} needs a question_id string or integer'}), 400
+    
+    results = [None] * len(answers)
+    items = []
+    positions = []
+    
+    for i, answer in enumerate(answers):
+        if answer.get('answer') is None:
+            results[i] = {'error': 'No answer provided'}
+            continue
+        
+        question = db.get_question_by_id(answer.get('question_id'))
+        if not question:
+            results[i] = {'error': 'Question not found'}
+            continue
+        
+        # Answers checked against the stored answer skip the API, as in verify_answer
+        if not data.get('enhanced'):
+            results[i] = feedback_generator.generate_quick_feedback(
+                question=question,
+                user_answer=answer['answer'],
+                original_explanation=question.get('explanation')
+            )
+            if results[i] is not None:
+                continue
+        
+        items.append({
+            'question': question,
+            'user_answer': answer['answer'],
+            'original_explanation': question.get('explanation'),
+            'context_text': get_context_for_question(question)
+        })
+        positions.append(i)
+    
+    feedback_results = await feedback_generator.batch_generate_feedback(items)
+    
+    for i, feedback_result in zip(positions, feedback_results):
+        if isinstance(feedback_result, Exception):
+            log.error("Error generating feedback: %s", feedback_result)
+            feedback_result = {'error': 'Failed to generate feedback'}
+        results[i] = feedback_result
+    
+    return jsonify(results)
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
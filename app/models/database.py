@@ -1,104 +1,468 @@
 # app/models/database.py
-import json
+import contextlib
+import functools
+import mmap
 import os
+import sys
+import threading
+from collections import defaultdict
 from pathlib import Path
+import orjson
+
+def dumps_record(record):
+    """Serialize a record to JSON bytes
+    
+    Records are serialized and parsed only through dumps_record and
+    loads_record, so the JSON library is chosen in one place
+    """
+    return orjson.dumps(record, option=orjson.OPT_NON_STR_KEYS)
+
+def loads_record(data):
+    """Parse a record from JSON bytes or str"""
+    return orjson.loads(data)
+
+# Files at least this big are memory-mapped for reading; below it the cost of
+# setting up the mapping outweighs the copy it saves
+MMAP_MIN_SIZE = 64 * 1024
+
+def _locked(method):
+    """Run a Database method while holding the instance lock"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
 
 class Database:
     def __init__(self, db_path='app/data'):
         self.db_path = Path(db_path)
-        self.videos_file = self.db_path / 'videos.json'
-        self.questions_file = self.db_path / 'questions.json'
+        # Records are stored as JSON Lines, one object per line, so adding
+        # records appends to the file instead of rewriting it
+        self.videos_file = self.db_path / 'videos.jsonl'
+        self.questions_file = self.db_path / 'questions.jsonl'
+        
+        # Last question ID handed out, kept apart from the records so IDs of
+        # deleted questions are never assigned again
+        self.question_id_file = self.db_path / 'question_id_seq'
+        
+        # Flask serves requests on several threads, and updates and deletes
+        # are a read-modify-write of a whole file
+        self._lock = threading.RLock()
+        
+        # Parsed records and lookup indexes of each file, tagged with the
+        # file state they were read from
+        self._cache = {}
+        
+        # Inside bulk(), writes only update the cache and the files they
+        # touched are written once when the outermost block exits
+        self._bulk_depth = 0
+        self._dirty = set()
         
         # Create data directory if it doesn't exist
         os.makedirs(self.db_path, exist_ok=True)
         
         # Initialize database files if they don't exist
-        if not self.videos_file.exists():
-            with open(self.videos_file, 'w') as f:
-                json.dump([], f)
+        for path in (self.videos_file, self.questions_file):
+            if not path.exists():
+                self._migrate_json_array(path)
+    
+    def _migrate_json_array(self, path):
+        """Create a JSON Lines file, converting the records of the JSON array
+        file it replaces if there is one
+        
+        The old file is left in place as a backup
+        """
+        legacy_file = path.with_suffix('.json')
+        records = []
+        
+        if legacy_file.exists():
+            with open(legacy_file, 'rb') as f:
+                records = loads_record(f.read())
+        
+        self._write_records(path, records)
+    
+    def _read_records(self, path):
+        """Yield the records of a JSON Lines file one at a time
+        
+        Large files are memory-mapped, and each line is parsed straight from
+        the mapped pages instead of being copied into a bytes object first
+        """
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            
+            if size < MMAP_MIN_SIZE:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        yield from self._parse_last_line(line)
+                    elif line.strip():
+                        yield loads_record(line)
+                return
+            
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                complete_size = mm.rfind(b'\n') + 1
+                yield from self._parse_mapped_lines(mm, complete_size)
+                yield from self._parse_last_line(mm[complete_size:])
+    
+    def _parse_mapped_lines(self, mm, size):
+        """Yield the records on the lines in the first size bytes of a
+        memory-mapped file
+        """
+        error = None
+        
+        with memoryview(mm) as view:
+            start = 0
+            while start < size:
+                end = mm.find(b'\n', start, size)
+                
+                if end > start:
+                    try:
+                        record = loads_record(view[start:end])
+                    except orjson.JSONDecodeError as e:
+                        # The exception holds on to the slice, which would stop
+                        # the mapping from being closed, so raise it afterwards
+                        error = f"Invalid record at byte {start}: {e}"
+                        break
+                    
+                    yield record
+                
+                start = end + 1
+        
+        if error:
+            raise ValueError(error)
+    
+    def _parse_last_line(self, line):
+        """Yield the record on a last line that has no newline, if it is whole
+        
+        An append cut short by a crash leaves a partial line at the end of the
+        file. It is skipped rather than making the whole file unreadable, and
+        the next append replaces it
+        """
+        if not line.strip():
+            return
+        
+        try:
+            record = loads_record(line)
+        except orjson.JSONDecodeError:
+            return
+        
+        yield record
+    
+    def _repair_last_line(self, f):
+        """Make a file opened for appending end with a whole line, dropping a
+        torn last line or adding the newline a whole one is missing
+        """
+        if not f.seek(0, os.SEEK_END):
+            return
+        
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) == b'\n':
+            return
+        
+        f.seek(0)
+        data = f.read()
+        complete_size = data.rfind(b'\n') + 1
+        
+        if any(True for _ in self._parse_last_line(data[complete_size:])):
+            f.write(b'\n')
+        else:
+            f.truncate(complete_size)
+    
+    def _file_key(self, path):
+        """Get the state of a file that tells whether it has changed, or None
+        if it hasn't been written yet
+        """
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+    
+    @_locked
+    def _load(self, path):
+        """Get the records of a JSON Lines file and their lookup indexes,
+        parsing the file again only when it has changed since it was last read
+        
+        Returns:
+            dict: 'records' in file order and 'indexes' by field, both shared
+                between callers
+        """
+        cached = self._cache.get(path)
+        
+        # Pending bulk writes are only in the cache
+        if path in self._dirty:
+            return cached
+        
+        if cached is None or cached['key'] != self._file_key(path):
+            cached = self._cache_records(path, list(self._read_records(path)))
+        
+        return cached
+    
+    def _cache_records(self, path, records):
+        """Cache the current records of a file"""
+        cached = {'key': self._file_key(path), 'records': records, 'indexes': {}}
+        self._index_records(path, cached['indexes'], records)
+        self._cache[path] = cached
+        return cached
+    
+    def _index_records(self, path, indexes, records):
+        """Add records to the lookup indexes of the file they belong to"""
+        if path == self.videos_file:
+            videos_by_id = indexes.setdefault('video_id', {})
+            for video in records:
+                videos_by_id[video['video_id']] = video
+        else:
+            # IDs taken from URLs are strings, so questions are keyed by the
+            # string form of each ID
+            questions_by_id = indexes.setdefault('question_id', {})
+            questions_by_video = indexes.setdefault('video_id', defaultdict(list))
+            for question in records:
+                # Field names are already shared by orjson's key cache, but each
+                # question parses its own copy of the video ID; interning them
+                # keeps one copy per video and lets index lookups match by identity
+                video_id = question.get('video_id')
+                if isinstance(video_id, str):
+                    video_id = question['video_id'] = sys.intern(video_id)
+                
+                questions_by_id[str(question.get('question_id'))] = question
+                questions_by_video[video_id].append(question)
+    
+    def _append_records(self, path, records):
+        """Append records to the end of a JSON Lines file"""
+        if self._bulk_depth:
+            cached = self._load(path)
+            cached['records'].extend(records)
+            self._index_records(path, cached['indexes'], records)
+            self._dirty.add(path)
+            return
+        
+        cached = self._cache.get(path)
+        is_current = cached is not None and cached['key'] == self._file_key(path)
+        
+        with open(path, 'a+b') as f:
+            self._repair_last_line(f)
+            f.writelines(dumps_record(record) + b'\n' for record in records)
+            f.flush()
+            os.fsync(f.fileno())
         
-        if not self.questions_file.exists():
-            with open(self.questions_file, 'w') as f:
-                json.dump([], f)
+        # Keep the cache in step instead of parsing the whole file again
+        if is_current:
+            cached['records'].extend(records)
+            self._index_records(path, cached['indexes'], records)
+            cached['key'] = self._file_key(path)
+        else:
+            self._cache.pop(path, None)
+    
+    def _write_records(self, path, records):
+        """Replace the contents of a JSON Lines file"""
+        self._cache_records(path, list(records))
+        self._save(path)
+    
+    def _save(self, path):
+        """Write the cached records of a file back to it, or inside bulk()
+        leave it to be written when the block exits
+        """
+        self._dirty.add(path)
+        
+        if not self._bulk_depth:
+            self.flush()
+    
+    @_locked
+    def flush(self):
+        """Write every file with changes that are only in the cache, once each"""
+        for path in self._dirty:
+            self._replace_file(path, self._cache[path]['records'])
+            self._cache[path]['key'] = self._file_key(path)
+        
+        self._dirty.clear()
+    
+    def _replace_file(self, path, records):
+        """Write records to a temporary file and move it over the original,
+        so a crash part way through never leaves a half-written file
+        """
+        tmp_file = path.with_name(path.name + '.tmp')
+        
+        with open(tmp_file, 'wb') as f:
+            f.writelines(dumps_record(record) + b'\n' for record in records)
+            f.flush()
+            os.fsync(f.fileno())
+        
+        os.replace(tmp_file, path)
+    
+    @contextlib.contextmanager
+    def bulk(self):
+        """Group several writes so each file they touch is written and synced
+        once, when the outermost bulk block exits
+        
+        If the block raises, its writes are discarded
+        """
+        with self._lock:
+            self._bulk_depth += 1
+            try:
+                yield self
+            except BaseException:
+                if self._bulk_depth == 1:
+                    for path in self._dirty:
+                        self._cache.pop(path, None)
+                    self._dirty.clear()
+                raise
+            else:
+                if self._bulk_depth == 1:
+                    self.flush()
+            finally:
+                self._bulk_depth -= 1
     
     def get_all_videos(self):
         """Get all videos from the database"""
-        with open(self.videos_file, 'r') as f:
-            return json.load(f)
+        return list(self._load(self.videos_file)['records'])
     
     def get_video_by_id(self, video_id):
         """Get a video by its ID"""
-        videos = self.get_all_videos()
-        for video in videos:
-            if video['video_id'] == video_id:
-                return video
-        return None
+        return self._load(self.videos_file)['indexes']['video_id'].get(video_id)
     
+    @_locked
     def add_video(self, video_dict):
         """Add a new video to the database"""
-        videos = self.get_all_videos()
-        videos.append(video_dict)
-        with open(self.videos_file, 'w') as f:
-            json.dump(videos, f, indent=2)
+        self._append_records(self.videos_file, [video_dict])
     
+    @_locked
     def update_video(self, video_id, updated_video):
-        """Update an existing video in the database"""
-        videos = self.get_all_videos()
-        for i, video in enumerate(videos):
-            if video['video_id'] == video_id:
-                videos[i] = updated_video
-                break
+        """Update an existing video in the database
         
-        with open(self.videos_file, 'w') as f:
-            json.dump(videos, f, indent=2)
+        Raises:
+            ValueError: If the update changes the video's ID, which its
+                questions refer to
+        """
+        if updated_video.get('video_id') != video_id:
+            raise ValueError(f"Video ID {video_id} cannot be changed to {updated_video.get('video_id')}")
+        
+        cached = self._load(self.videos_file)
+        video = cached['indexes']['video_id'].get(video_id)
+        
+        if video is None:
+            return
+        
+        # Readers get the cached records without the lock, so the update is
+        # a new dict swapped in for the old one rather than a change to it
+        records = cached['records']
+        position = next(i for i, record in enumerate(records) if record is video)
+        records[position] = cached['indexes']['video_id'][video_id] = dict(updated_video)
+        
+        self._save(self.videos_file)
     
     def get_questions_for_video(self, video_id):
         """Get all questions for a specific video"""
-        with open(self.questions_file, 'r') as f:
-            all_questions = json.load(f)
-        
-        return [q for q in all_questions if q['video_id'] == video_id]
+        return list(self._load(self.questions_file)['indexes']['video_id'].get(video_id, []))
     
     def get_all_questions(self):
         """Get all questions from the database"""
-        with open(self.questions_file, 'r') as f:
-            return json.load(f)
+        return list(self._load(self.questions_file)['records'])
     
+    def count_questions_by_video(self):
+        """Get the number of questions of each video that has any, by video ID"""
+        questions_by_video = self._load(self.questions_file)['indexes']['video_id']
+        return {video_id: len(questions) for video_id, questions in questions_by_video.items() if questions}
+    
+    def get_question_by_id(self, question_id):
+        """Get a question by its ID"""
+        return self._load(self.questions_file)['indexes']['question_id'].get(str(question_id))
+    
+    @_locked
     def add_questions(self, questions):
-        """Add questions to the database"""
-        with open(self.questions_file, 'r') as f:
-            all_questions = json.load(f)
+        """Add questions to the database, assigning each a new integer ID
         
-        all_questions.extend(questions)
+        Returns the list of assigned IDs
+        """
+        for question, question_id in zip(questions, self._reserve_question_ids(len(questions))):
+            question['question_id'] = question_id
         
-        with open(self.questions_file, 'w') as f:
-            json.dump(all_questions, f, indent=2)
+        self._append_records(self.questions_file, questions)
+        
+        return [question['question_id'] for question in questions]
     
+    def _reserve_question_ids(self, count):
+        """Take the next count question IDs from the persisted counter
+        
+        The counter is saved before the questions are, so a failed write
+        skips IDs instead of reusing them
+        """
+        try:
+            last_id = int(self.question_id_file.read_text())
+        except (FileNotFoundError, ValueError):
+            # Stores created before the counter continue after their highest
+            # integer ID; older string IDs are left alone
+            last_id = max((q['question_id'] for q in self._load(self.questions_file)['records'] if isinstance(q.get('question_id'), int)), default=0)
+        
+        tmp_file = self.question_id_file.with_name(self.question_id_file.name + '.tmp')
+        with open(tmp_file, 'w') as f:
+            f.write(str(last_id + count))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.question_id_file)
+        
+        return range(last_id + 1, last_id + count + 1)
+    
+    @_locked
     def delete_questions_for_video(self, video_id):
         """Delete all questions for a specific video"""
-        with open(self.questions_file, 'r') as f:
-            all_questions = json.load(f)
+        cached = self._load(self.questions_file)
+        
+        # Nothing to rewrite if the video has no questions
+        if video_id not in cached['indexes']['video_id']:
+            return
         
         # Filter out questions for the specified video
-        filtered_questions = [q for q in all_questions if q.get('video_id') != video_id]
+        filtered_questions = [q for q in cached['records'] if q.get('video_id') != video_id]
         
         # Save the filtered list back to the file
-        with open(self.questions_file, 'w') as f:
-            json.dump(filtered_questions, f, indent=2)
-
+        self._write_records(self.questions_file, filtered_questions)
+    
+    @_locked
     def delete_video(self, video_id):
         """Delete a video from the database by its ID"""
-        videos = self.get_all_videos()
+        cached = self._load(self.videos_file)
+        
+        if video_id not in cached['indexes']['video_id']:
+            raise ValueError(f"Video with ID {video_id} not found")
         
         # Filter out the video to be deleted
-        updated_videos = [v for v in videos if v.get('video_id') != video_id]
+        updated_videos = [v for v in cached['records'] if v.get('video_id') != video_id]
+        
+        # Write the updated videos list back to the file
+        self._write_records(self.videos_file, updated_videos)
+        
+        return True
+    
+    @_locked
+    def delete_video_and_questions(self, video_id):
+        """Delete a video and all of its questions, rewriting each file once"""
+        videos = self._load(self.videos_file)
         
-        # If the lengths are the same, the video wasn't found
-        if len(videos) == len(updated_videos):
+        if video_id not in videos['indexes']['video_id']:
             raise ValueError(f"Video with ID {video_id} not found")
         
-        # Write the updated videos list back to the file
-        with open(self.videos_file, 'w') as f:
-            json.dump(updated_videos, f, indent=2)
+        with self.bulk():
+            self.delete_questions_for_video(video_id)
+            self._write_records(self.videos_file, [v for v in videos['records'] if v.get('video_id') != video_id])
         
-        return True
\ No newline at end of file
+        return True
+
+_instance = None
+_instance_lock = threading.Lock()
+
+def get_db():
+    """Get the database shared by the whole process, creating it on first use
+    
+    DATABASE_BACKEND=sqlite selects the SQLite store instead of JSON Lines
+    files. Sharing one instance keeps its caches warm across requests
+    """
+    global _instance
+    
+    with _instance_lock:
+        if _instance is None:
+            if os.getenv('DATABASE_BACKEND') == 'sqlite':
+                from app.models.sqlite_database import SQLiteDatabase
+                _instance = SQLiteDatabase()
+            else:
+                _instance = Database()
+    
+    return _instance
@@ -1,15 +1,16 @@
 # app/models/question.py
+from dataclasses import dataclass
+
+@dataclass(slots=True)
 class Question:
-    def __init__(self, question_id, video_id, timestamp_start, timestamp_end, 
-                 question_text, options, correct_answer, explanation):
-        self.question_id = question_id
-        self.video_id = video_id
-        self.timestamp_start = timestamp_start
-        self.timestamp_end = timestamp_end
-        self.question_text = question_text
-        self.options = options
-        self.correct_answer = correct_answer
-        self.explanation = explanation
+    question_id: int
+    video_id: str
+    timestamp_start: float
+    timestamp_end: float
+    question_text: str
+    options: list
+    correct_answer: str
+    explanation: str
     
     def to_dict(self):
         """Convert question object to dictionary"""
@@ -26,14 +27,5 @@ class Question:
     
     @classmethod
     def from_dict(cls, data):
-        """Create a Question object from a dictionary"""
-        return cls(
-            question_id=data.get('question_id'),
-            video_id=data.get('video_id'),
-            timestamp_start=data.get('timestamp_start'),
-            timestamp_end=data.get('timestamp_end'),
-            question_text=data.get('question_text'),
-            options=data.get('options'),
-            correct_answer=data.get('correct_answer'),
-            explanation=data.get('explanation')
-        )
\ No newline at end of file
+        """Create a Question object from a dictionary, ignoring unknown keys"""
+        return cls(**{name: data.get(name) for name in cls.__dataclass_fields__})
\ No newline at end of file
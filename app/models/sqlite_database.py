@@ -0,0 +1,267 @@
+# app/models/sqlite_database.py
+import contextlib
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from app.models.database import dumps_record, loads_record
+
+# PRAGMA user_version once the JSON Lines store has been imported, so
+# videos deleted afterwards are not imported again on the next start
+JSON_LINES_IMPORTED = 1
+
+class SQLiteDatabase:
+    """SQLite implementation of the Database interface
+    
+    Videos and questions are stored as JSON documents in tables keyed and
+    indexed by the fields they are looked up by, so lookups and deletes
+    touch only the matching rows instead of whole files.
+    """
+    
+    def __init__(self, db_path='app/data'):
+        self.db_path = Path(db_path)
+        self.db_file = self.db_path / 'learning.db'
+        
+        # sqlite3 connections can't be shared between threads, so each
+        # thread opens its own
+        self._local = threading.local()
+        
+        # Create data directory if it doesn't exist
+        os.makedirs(self.db_path, exist_ok=True)
+        
+        with self._transaction() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS videos (
+                    video_id TEXT PRIMARY KEY,
+                    json TEXT NOT NULL
+                );
+            """)
+            self._create_questions_table(conn)
+        
+        self._import_json_lines()
+    
+    def _create_questions_table(self, conn):
+        """Create the questions table, rebuilding one made before question IDs
+        were AUTOINCREMENT
+        
+        AUTOINCREMENT keeps the highest ID ever used in sqlite_sequence, so
+        IDs of deleted questions are never assigned again
+        """
+        row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'questions'").fetchone()
+        if row is not None and 'AUTOINCREMENT' in row[0].upper():
+            return
+        
+        # Rebuild in one transaction, so a crash leaves the old table intact
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+        conn.execute("""
+            CREATE TABLE questions_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                question_key TEXT NOT NULL UNIQUE,
+                video_id TEXT NOT NULL,
+                json TEXT NOT NULL
+            )
+        """)
+        if row is not None:
+            conn.execute("INSERT INTO questions_new SELECT id, question_key, video_id, json FROM questions")
+            conn.execute("DROP TABLE questions")
+        conn.execute("ALTER TABLE questions_new RENAME TO questions")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_questions_video_id ON questions (video_id)")
+    
+    def _connect(self):
+        """Get the connection of the current thread, opening it if needed"""
+        conn = getattr(self._local, 'conn', None)
+        
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            # WAL lets readers run while a write is in progress
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        
+        return conn
+    
+    @contextlib.contextmanager
+    def _transaction(self):
+        """Run a block in a transaction, or as part of the enclosing one when
+        called inside bulk()
+        """
+        conn = self._connect()
+        depth = getattr(self._local, 'depth', 0)
+        self._local.depth = depth + 1
+        
+        try:
+            if depth:
+                yield conn
+            else:
+                with conn:
+                    yield conn
+        finally:
+            self._local.depth = depth
+    
+    def bulk(self):
+        """Group several writes into one transaction, committed when the
+        outermost bulk block exits
+        
+        If the block raises, its writes are rolled back
+        """
+        return self._transaction()
+    
+    def flush(self):
+        """Kept for parity with Database; writes are committed as they happen"""
+    
+    def _import_json_lines(self):
+        """Import the records of the JSON Lines store the first time the
+        database is opened, if it is empty
+        
+        The check, the import and the marker share one write transaction, so
+        workers starting together import the records only once
+        """
+        conn = self._connect()
+        videos_file = self.db_path / 'videos.jsonl'
+        questions_file = self.db_path / 'questions.jsonl'
+        
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("PRAGMA user_version").fetchone()[0] >= JSON_LINES_IMPORTED:
+                return
+            
+            conn.execute(f"PRAGMA user_version = {JSON_LINES_IMPORTED}")
+            if conn.execute("SELECT EXISTS (SELECT 1 FROM videos) OR EXISTS (SELECT 1 FROM questions)").fetchone()[0]:
+                return
+            
+            if videos_file.exists():
+                conn.executemany(
+                    "INSERT OR REPLACE INTO videos (video_id, json) VALUES (?, ?)",
+                    ((video['video_id'], self._dumps(video)) for video in self._read_json_lines(videos_file))
+                )
+            
+            if questions_file.exists():
+                # Integer IDs are kept, so they are inserted first. Older string
+                # IDs get a new row ID but are still looked up by their value
+                questions = sorted(self._read_json_lines(questions_file), key=lambda q: not isinstance(q.get('question_id'), int))
+                conn.executemany(
+                    "INSERT INTO questions (id, question_key, video_id, json) VALUES (?, ?, ?, ?)",
+                    (
+                        (q['question_id'] if isinstance(q.get('question_id'), int) else None,
+                         str(q.get('question_id')), q.get('video_id'), self._dumps(q))
+                        for q in questions
+                    )
+                )
+    
+    def _read_json_lines(self, path):
+        """Yield the records of a JSON Lines file one at a time"""
+        with open(path, 'rb') as f:
+            for line in f:
+                if line.strip():
+                    yield loads_record(line)
+    
+    def _dumps(self, record):
+        """Serialize a record for storage"""
+        return dumps_record(record).decode()
+    
+    def get_all_videos(self):
+        """Get all videos from the database"""
+        rows = self._connect().execute("SELECT json FROM videos ORDER BY rowid")
+        return [loads_record(row[0]) for row in rows]
+    
+    def get_video_by_id(self, video_id):
+        """Get a video by its ID"""
+        row = self._connect().execute("SELECT json FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+        return loads_record(row[0]) if row else None
+    
+    def add_video(self, video_dict):
+        """Add a new video to the database"""
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO videos (video_id, json) VALUES (?, ?)",
+                (video_dict['video_id'], self._dumps(video_dict))
+            )
+    
+    def update_video(self, video_id, updated_video):
+        """Update an existing video in the database
+        
+        Raises:
+            ValueError: If the update changes the video's ID, which its
+                questions refer to
+        """
+        if updated_video.get('video_id') != video_id:
+            raise ValueError(f"Video ID {video_id} cannot be changed to {updated_video.get('video_id')}")
+        
+        with self._transaction() as conn:
+            conn.execute("UPDATE videos SET json = ? WHERE video_id = ?", (self._dumps(updated_video), video_id))
+    
+    def get_questions_for_video(self, video_id):
+        """Get all questions for a specific video"""
+        rows = self._connect().execute("SELECT json FROM questions WHERE video_id = ? ORDER BY id", (video_id,))
+        return [loads_record(row[0]) for row in rows]
+    
+    def get_all_questions(self):
+        """Get all questions from the database"""
+        rows = self._connect().execute("SELECT json FROM questions ORDER BY id")
+        return [loads_record(row[0]) for row in rows]
+    
+    def count_questions_by_video(self):
+        """Get the number of questions of each video that has any, by video ID"""
+        return dict(self._connect().execute("SELECT video_id, COUNT(*) FROM questions GROUP BY video_id"))
+    
+    def get_question_by_id(self, question_id):
+        """Get a question by its ID
+        
+        IDs taken from URLs are strings, so questions are keyed by the string
+        form of each ID
+        """
+        row = self._connect().execute("SELECT json FROM questions WHERE question_key = ?", (str(question_id),)).fetchone()
+        return loads_record(row[0]) if row else None
+    
+    def add_questions(self, questions):
+        """Add questions to the database, assigning each a new integer ID
+        
+        Returns the list of assigned IDs
+        """
+        with self._transaction() as conn:
+            # Take the write lock before reading the highest ID, so concurrent
+            # writers can't assign the same IDs
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            next_id = conn.execute(
+                "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'questions'), 0)"
+            ).fetchone()[0] + 1
+            
+            for question in questions:
+                question['question_id'] = next_id
+                next_id += 1
+            
+            conn.executemany(
+                "INSERT INTO questions (id, question_key, video_id, json) VALUES (?, ?, ?, ?)",
+                ((q['question_id'], str(q['question_id']), q.get('video_id'), self._dumps(q)) for q in questions)
+            )
+        
+        return [question['question_id'] for question in questions]
+    
+    def delete_questions_for_video(self, video_id):
+        """Delete all questions for a specific video"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM questions WHERE video_id = ?", (video_id,))
+    
+    def delete_video(self, video_id):
+        """Delete a video from the database by its ID"""
+        with self._transaction() as conn:
+            cursor = conn.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
+        
+        if cursor.rowcount == 0:
+            raise ValueError(f"Video with ID {video_id} not found")
+        
+        return True
+    
+    def delete_video_and_questions(self, video_id):
+        """Delete a video and all of its questions in one transaction"""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM questions WHERE video_id = ?", (video_id,))
+            cursor = conn.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
+            
+            # Raising inside the transaction rolls back the question delete
+            if cursor.rowcount == 0:
+                raise ValueError(f"Video with ID {video_id} not found")
+        
+        return True
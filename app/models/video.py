@@ -1,17 +1,38 @@
 # app/models/video.py
+from dataclasses import dataclass, field
 from datetime import datetime
 
+# Fields of a stored video that are only needed to answer and generate
+# questions. Video listings leave them out, and the segments are served by
+# the subtitles endpoint
+DETAIL_FIELDS = frozenset(('subtitle_segments', 'topic_chunks'))
+
+def video_summary(video, questions_count=0):
+    """Get a stored video without its subtitle segments and topic chunks
+    
+    Questions are stored apart from their video, so their count is passed in
+    """
+    summary = {key: value for key, value in video.items() if key not in DETAIL_FIELDS}
+    summary['questions_count'] = questions_count
+    return summary
+
+@dataclass(slots=True)
 class Video:
-    def __init__(self, video_id, title, file_path, subtitle_path=None, duration=None):
-        self.video_id = video_id
-        self.title = title
-        self.file_path = file_path
-        self.subtitle_path = subtitle_path
-        self.duration = duration
-        self.created_at = datetime.now()
-        self.subtitle_segments = []
-        self.topic_chunks = []
-        self.questions = []
+    video_id: str
+    title: str
+    file_path: str
+    subtitle_path: str = None
+    duration: float = None
+    is_youtube: bool = False
+    youtube_id: str = None
+    # Kept as the ISO string it is stored as, so to_dict has no formatting to do
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    subtitle_segments: list = field(default_factory=list, init=False)
+    topic_chunks: list = field(default_factory=list, init=False)
+    # Counts are kept up to date by the add_* methods, so to_dict doesn't
+    # have to measure the lists
+    subtitle_segments_count: int = field(default=0, init=False)
+    topic_chunks_count: int = field(default=0, init=False)
     
     def to_dict(self):
         """Convert video object to dictionary"""
@@ -21,16 +42,22 @@ class Video:
             'file_path': self.file_path,
             'subtitle_path': self.subtitle_path,
             'duration': self.duration,
-            'created_at': self.created_at.isoformat(),
-            'subtitle_segments_count': len(self.subtitle_segments),
-            'topic_chunks_count': len(self.topic_chunks),
-            'questions_count': len(self.questions)
+            'is_youtube': self.is_youtube,
+            'youtube_id': self.youtube_id,
+            'created_at': self.created_at,
+            'subtitle_segments': self.subtitle_segments,
+            # Chunk segments are already stored in subtitle_segments
+            'topic_chunks': [{k: v for k, v in chunk.items() if k != 'segments'} for chunk in self.topic_chunks],
+            'subtitle_segments_count': self.subtitle_segments_count,
+            'topic_chunks_count': self.topic_chunks_count
         }
     
     def add_subtitle_segments(self, segments):
         """Add parsed subtitle segments to the video"""
         self.subtitle_segments = segments
+        self.subtitle_segments_count = len(segments)
     
     def add_topic_chunks(self, chunks):
         """Add topic chunks to the video"""
-        self.topic_chunks = chunks
\ No newline at end of file
+        self.topic_chunks = chunks
+        self.topic_chunks_count = len(chunks)
\ No newline at end of file
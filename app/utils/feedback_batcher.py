@@ -0,0 +1,117 @@
+# app/utils/feedback_batcher.py
+import io
+import logging
+import time
+import orjson
+from app.utils.openai_client import get_client
+
+# Batch states after which no more results will be written
+FINISHED_STATES = ("completed", "failed", "expired", "cancelled")
+
+log = logging.getLogger(__name__)
+
+class FeedbackBatcher:
+    """Generate feedback for many answers through the OpenAI Batch API
+    
+    Batches cost half as much as regular requests but can take up to a day,
+    so this suits re-grading a whole class rather than answering a learner.
+    """
+    
+    def __init__(self, feedback_generator):
+        """Create a batcher
+        
+        Args:
+            feedback_generator (FeedbackGenerator): Builds the prompts and parses the results
+        """
+        self.feedback_generator = feedback_generator
+        # Items of the batches submitted by this process, by batch ID
+        self._submitted = {}
+    
+    def submit_batch_feedback(self, items):
+        """Submit feedback requests for a list of answers
+        
+        Args:
+            items (list): Keyword arguments for generate_feedback, one dict per answer
+        
+        Returns:
+            str: ID of the created batch, or None if no answer needs a request
+        """
+        lines = []
+        for i, item in enumerate(items):
+            request = self.feedback_generator.feedback_request(**item)
+            if request["feedback"] is None:
+                lines.append(orjson.dumps({
+                    "custom_id": str(i),
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": request["options"]
+                }))
+        
+        if not lines:
+            return None
+        
+        batch_file = get_client().files.create(
+            file=("feedback_batch.jsonl", io.BytesIO(b"\n".join(lines))),
+            purpose="batch"
+        )
+        batch = get_client().batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        
+        self._submitted[batch.id] = items
+        return batch.id
+    
+    def poll_batch(self, batch_id, items=None, poll_interval=60):
+        """Wait for a batch to finish and build the feedback for its answers
+        
+        Args:
+            batch_id (str): ID returned by submit_batch_feedback
+            items (list, optional): The submitted items, needed when the batch
+                was submitted by another process
+            poll_interval (int): Seconds between status checks
+        
+        Returns:
+            list: Feedback for each item in order. Answers whose request failed
+                get template feedback, and borderline short answer scores are
+                checked again by the larger model without batching
+        """
+        items = items if items is not None else self._submitted[batch_id]
+        
+        batch = get_client().batches.retrieve(batch_id)
+        while batch.status not in FINISHED_STATES:
+            time.sleep(poll_interval)
+            batch = get_client().batches.retrieve(batch_id)
+        
+        if batch.status != "completed":
+            log.warning("Feedback batch %s %s, using template feedback for unfinished answers", batch_id, batch.status)
+        
+        # Successful responses by the index of their item
+        responses = {}
+        if batch.output_file_id:
+            for line in get_client().files.content(batch.output_file_id).content.splitlines():
+                if line.strip():
+                    output = orjson.loads(line)
+                    response = output.get("response") or {}
+                    if response.get("status_code") == 200:
+                        responses[output["custom_id"]] = response["body"]
+        
+        results = []
+        for i, item in enumerate(items):
+            request = self.feedback_generator.feedback_request(**item)
+            if request["feedback"] is not None:
+                results.append(request["feedback"])
+                continue
+            
+            try:
+                if str(i) not in responses:
+                    raise ValueError("no successful response in batch")
+                content = responses[str(i)]["choices"][0]["message"]["content"]
+                results.append(self.feedback_generator.complete_request(request, content))
+            except Exception as e:
+                log.error("Error generating batch feedback: %s", e)
+                results.append(request["fallback"]())
+        
+        self._submitted.pop(batch_id, None)
+        return results
@@ -1,53 +1,240 @@
 # app/utils/feedback_generator.py
+import asyncio
+import difflib
+import functools
+import logging
 import os
 import random
-import json
-from openai import OpenAI
-from dotenv import load_dotenv
+import re
+from concurrent.futures import ThreadPoolExecutor
+import orjson
+from app.utils.llm_cache import LLMCache
+from app.utils.openai_client import acreate_completion, get_client
+from app.utils.semantic_cache import SemanticCache
 
-# Load environment variables
-load_dotenv()
+try:
+    from rapidfuzz.fuzz import ratio as fuzz_ratio
+except ImportError:
+    fuzz_ratio = None
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+log = logging.getLogger(__name__)
+
+# Most feedback API requests a batch has in flight at once, to stay within
+# the OpenAI rate limits
+MAX_CONCURRENCY = int(os.getenv("FEEDBACK_MAX_CONCURRENCY", 16))
+
+# Feedback is written by the small model. Short answers it scores in the
+# borderline range are scored again by the larger model, unless
+# FEEDBACK_ESCALATION_MODEL is set empty
+FEEDBACK_MODEL = "gpt-4o-mini"
+ESCALATION_MODEL = os.getenv("FEEDBACK_ESCALATION_MODEL", "gpt-4o")
+ESCALATION_MIN_SCORE = 60
+ESCALATION_MAX_SCORE = 80
+
+# Variety of feedback starters for incorrect answers
+INCORRECT_STARTERS = (
+    "Not quite.",
+    "That's not correct.",
+    "Your answer isn't quite right.",
+    "That's a common misconception.",
+    "You're on the right track, but not quite there.",
+    "Close, but not quite correct.",
+    "That's not the right answer.",
+    "This isn't the correct option.",
+    "Good attempt, but that's not right.",
+    "That's not accurate in this case.",
+    "That's a reasonable guess, but it's not correct.",
+    "That's not the answer we're looking for.",
+    "That option isn't correct.",
+    "Your understanding needs a small adjustment here."
+)
+
+# Variety of feedback starters for correct answers
+CORRECT_STARTERS = (
+    "Excellent!",
+    "That's correct!",
+    "Perfect answer!",
+    "Well done!",
+    "You got it!",
+    "Spot on!",
+    "That's exactly right!",
+    "Great job!",
+    "You're absolutely right!",
+    "Correct!",
+    "That's the right answer!",
+    "You've understood this well!",
+    "That's perfect!",
+    "You're showing good understanding here!"
+)
+
+# Similarity to the correct fill in the blank answer, out of 100, at which
+# an answer counts as a typo of it or as partially correct
+TYPO_SIMILARITY = 90
+PARTIAL_SIMILARITY = 70
+
+# The feedback string of a streamed JSON response, once its closing quote
+# has arrived
+FEEDBACK_FIELD_PATTERN = re.compile(r'"feedback"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+# Answers saying the learner doesn't know, graded 0% without the API. Words
+# like "none" are left to the API, since they can be the right answer
+NON_ANSWER_PATTERN = re.compile(
+    r"^\W*(?:i\s*(?:do\s*n[o']?t|dont)\s*know|idk|no\s*idea|dunno|not\s*sure)\W*$",
+    re.IGNORECASE
+)
+
+@functools.lru_cache(maxsize=4096)
+def key_point_pattern(point):
+    """Compile a pattern matching any word longer than 3 characters of a key
+    point, or None if it has none
+    """
+    keywords = [word.lower() for word in point.split() if len(word) > 3]
+    return re.compile("|".join(map(re.escape, keywords))) if keywords else None
+
+# General educational resources for various topics, suggested when the API
+# doesn't provide any
+GENERAL_RESOURCES = (
+    {
+        "title": "Khan Academy",
+        "url": "https://www.khanacademy.org/",
+        "description": "Free educational resources across many subjects with video lessons and practice exercises."
+    },
+    {
+        "title": "MIT OpenCourseWare",
+        "url": "https://ocw.mit.edu/",
+        "description": "Free course materials from MIT covering a wide range of subjects."
+    },
+    {
+        "title": "Coursera",
+        "url": "https://www.coursera.org/",
+        "description": "Online courses from top universities and companies across many disciplines."
+    },
+    {
+        "title": "edX",
+        "url": "https://www.edx.org/",
+        "description": "Online courses from leading educational institutions on a variety of topics."
+    },
+    {
+        "title": "MDN Web Docs",
+        "url": "https://developer.mozilla.org/",
+        "description": "Comprehensive documentation for web technologies and programming."
+    },
+    {
+        "title": "W3Schools",
+        "url": "https://www.w3schools.com/",
+        "description": "Web development tutorials and reference materials with interactive examples."
+    },
+    {
+        "title": "Digital Ocean Community Tutorials",
+        "url": "https://www.digitalocean.com/community/tutorials",
+        "description": "Detailed technical tutorials on programming, software, and system administration."
+    }
+)
+
+# The instructions for each question type are sent first as the system
+# message, identical in every request, so OpenAI can reuse the cached prompt
+# prefix. Everything specific to an answer goes in the user message after it
+RESOURCES_INSTRUCTIONS = """
+Additionally, suggest 2-3 high-quality web resources (with URLs) where the user can learn more about this topic.
+These should be reputable sources like educational websites, documentation, or well-known blogs.
+"""
+
+RESOURCES_FORMAT = """
+    "additional_resources": [
+        {
+            "title": "Resource Title 1",
+            "url": "https://example.com/resource1",
+            "description": "Brief description of this resource"
+        },
+        {
+            "title": "Resource Title 2",
+            "url": "https://example.com/resource2",
+            "description": "Brief description of this resource"
+        }
+    ]
+}
+"""
+
+MULTIPLE_CHOICE_SYSTEM_PROMPT = """
+You are an educational assistant providing natural, varied, and conversational feedback on quiz answers.
+You will be given a multiple-choice question, the option the user selected, the correct option, the
+original explanation and context from the video.
+
+Please provide personalized feedback that:
+1. Uses a natural, conversational tone
+2. Does NOT start with generic phrases like "That's not quite right" or "That's incorrect"
+3. Explains why the correct answer is right and (if applicable) why the user's choice was wrong
+4. Connects the explanation to relevant concepts from the video
+5. Is encouraging and supportive
+6. Is concise (2-4 sentences)
+""" + RESOURCES_INSTRUCTIONS + """
+Format your response as a JSON object with the following structure:
+{
+    "feedback": "Your detailed, conversational feedback here",""" + RESOURCES_FORMAT + """
+IMPORTANT:
+- Do not use numbered lists or points in your feedback
+- Do not use phrases like "Feedback:" or other labels
+- Vary your language and avoid repetitive phrasing
+- Don't just restate the original explanation - provide additional insight
+- For educational resources, select a diverse set of high-quality links
+- Make sure URLs are valid and point to legitimate educational resources
+"""
+
+FILL_IN_BLANK_SYSTEM_PROMPT = """
+You are an educational assistant providing feedback on fill-in-the-blank questions.
+You will be given the question, the user's answer, the correct answer, whether the answer matched,
+the original explanation and context from the video.
+
+Please provide personalized feedback that:
+1. Uses a natural, conversational tone
+2. Acknowledges if the answer was correct, partially correct, or incorrect
+3. Explains the correct answer and any nuances in wording that might be important
+4. Connects the explanation to relevant concepts from the video
+5. Is encouraging and supportive
+6. Is concise (2-4 sentences)
+""" + RESOURCES_INSTRUCTIONS + """
+Format your response as a JSON object with the following structure:
+{
+    "feedback": "Your detailed, conversational feedback here",""" + RESOURCES_FORMAT
+
+SHORT_ANSWER_SYSTEM_PROMPT = """
+You are an educational assistant evaluating short answer responses.
+You will be given the question, the student's answer, a sample correct answer, the key points that
+should be included, an explanation of what makes a good answer and context from the video.
+
+Please evaluate the student's answer on a scale of 0-100%, where:
+- 0-10%: Very minimal, irrelevant, or nonsensical answer
+- 11-30%: Missing nearly all key points, major misconceptions
+- 31-50%: Includes at least one key point but has significant gaps
+- 51-70%: Includes some key points with minor misconceptions
+- 71-90%: Includes most key points with minor issues
+- 91-100%: Includes all key points and demonstrates thorough understanding
+
+VERY IMPORTANT: If the answer is very short (less than 10 words) and doesn't address any of the key points, give a score under 20%.
+""" + RESOURCES_INSTRUCTIONS + """
+Format your response as a JSON object with the following structure:
+{
+    "score_percentage": 85,
+    "feedback": "Your detailed, conversational feedback here",""" + RESOURCES_FORMAT
 
 class FeedbackGenerator:
     def __init__(self):
-        # Variety of feedback starters for incorrect answers
-        self.incorrect_starters = [
-            "Not quite.",
-            "That's not correct.",
-            "Your answer isn't quite right.",
-            "That's a common misconception.",
-            "You're on the right track, but not quite there.",
-            "Close, but not quite correct.",
-            "That's not the right answer.",
-            "This isn't the correct option.",
-            "Good attempt, but that's not right.",
-            "That's not accurate in this case.",
-            "That's a reasonable guess, but it's not correct.",
-            "That's not the answer we're looking for.",
-            "That option isn't correct.",
-            "Your understanding needs a small adjustment here."
-        ]
-        
-        # Variety of feedback starters for correct answers
-        self.correct_starters = [
-            "Excellent!",
-            "That's correct!",
-            "Perfect answer!",
-            "Well done!",
-            "You got it!",
-            "Spot on!",
-            "That's exactly right!",
-            "Great job!",
-            "You're absolutely right!",
-            "Correct!",
-            "That's the right answer!",
-            "You've understood this well!",
-            "That's perfect!",
-            "You're showing good understanding here!"
-        ]
+        # Identical answers to the same question get the same feedback, so
+        # resubmissions are served without another API call
+        self.cache = LLMCache(
+            "feedback",
+            ttl=int(os.getenv("FEEDBACK_CACHE_TTL", 86400)),
+            redis_url=os.getenv("FEEDBACK_CACHE_REDIS_URL"),
+            cache_dir=os.getenv("FEEDBACK_CACHE_DIR")
+        )
+        
+        # Paraphrased short answers and near-identical fill in the blank
+        # answers are served the feedback of the closest earlier answer. No
+        # similarity is above 1, so a higher threshold turns this off
+        threshold = float(os.getenv("FEEDBACK_SEMANTIC_THRESHOLD", 0.93))
+        self.semantic_cache = None
+        if threshold <= 1:
+            self.semantic_cache = SemanticCache(threshold=threshold, ttl=int(os.getenv("FEEDBACK_CACHE_TTL", 86400)))
     
     def generate_feedback(self, question, user_answer, original_explanation, context_text=None):
         """Generate personalized feedback for a user's answer
@@ -61,485 +248,694 @@ class FeedbackGenerator:
         Returns:
             dict: Feedback information including correctness and explanation
         """
-        # Determine the question type and handle accordingly
-        question_type = question.get("type", "multiple_choice")
+        request = self.feedback_request(question, user_answer, original_explanation, context_text)
+        if request["feedback"] is not None:
+            return request["feedback"]
         
-        if question_type == "multiple_choice":
-            is_correct = user_answer == question.get("correct_answer")
-            return self._generate_multiple_choice_feedback(question, user_answer, is_correct, original_explanation, context_text)
-        
-        elif question_type == "fill_in_the_blank":
-            # For fill in the blank, do more fuzzy matching
-            user_answer_normalized = user_answer.strip().lower()
-            correct_answer_normalized = question.get("correct_answer", "").strip().lower()
+        try:
+            response = get_client().chat.completions.create(**request["options"])
+            return self.complete_request(request, response.choices[0].message.content)
             
-            # Check for exact match or close match
-            is_correct = user_answer_normalized == correct_answer_normalized
+        except Exception as e:
+            log.error("Error generating feedback: %s", e)
+            return request["fallback"]()
+    
+    async def agenerate_feedback(self, question, user_answer, original_explanation, context_text=None):
+        """Generate personalized feedback without blocking the event loop
+        
+        Takes the same arguments and returns the same result as
+        generate_feedback. Awaiting several calls together with asyncio.gather
+        runs their API requests concurrently.
+        """
+        # Prepared on a worker thread, since looking up similar answers embeds
+        # the answer with a blocking API call
+        request = await asyncio.to_thread(self.feedback_request, question, user_answer, original_explanation, context_text)
+        if request["feedback"] is not None:
+            return request["feedback"]
+        
+        try:
+            response = await acreate_completion(**request["options"])
+            return await self.acomplete_request(request, response.choices[0].message.content)
             
-            # If it's not an exact match, check if it's a substring or if correct answer is a substring
-            if not is_correct:
-                if user_answer_normalized in correct_answer_normalized or correct_answer_normalized in user_answer_normalized:
-                    is_partial = True
-                    return self._generate_fill_in_blank_feedback(question, user_answer, "partial", original_explanation, context_text)
+        except Exception as e:
+            log.error("Error generating feedback: %s", e)
+            return request["fallback"]()
+    
+    async def batch_generate_feedback(self, items, max_concurrency=MAX_CONCURRENCY):
+        """Generate feedback for several answers concurrently
+        
+        Rate limited requests are retried with backoff by the OpenAI client.
+        
+        Args:
+            items (list): Keyword arguments for agenerate_feedback, one dict per answer
+            max_concurrency (int): Most API requests in flight at once
             
-            return self._generate_fill_in_blank_feedback(question, user_answer, "correct" if is_correct else "incorrect", original_explanation, context_text)
+        Returns:
+            list: Feedback for each item in order, or the exception it raised
+        """
+        # Created here, since a semaphore is bound to the loop it is first used on
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def generate(item):
+            async with semaphore:
+                return await self.agenerate_feedback(**item)
+        
+        return await asyncio.gather(*(generate(item) for item in items), return_exceptions=True)
+    
+    def batch_generate_feedback_sync(self, items, max_workers=MAX_CONCURRENCY):
+        """Generate feedback for several answers concurrently on worker threads
+        
+        For callers without an event loop. Takes the same arguments and
+        returns the same result as batch_generate_feedback.
+        """
+        def generate(item):
+            try:
+                return self.generate_feedback(**item)
+            except Exception as e:
+                return e
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(generate, items))
+    
+    def feedback_request(self, question, user_answer, original_explanation, context_text=None):
+        """Prepare the API request for an answer without sending it
+        
+        Every way of generating feedback goes through here, so they all grade
+        locally, look up cached feedback and route to models the same way.
+        Used directly to send requests through other channels, such as the
+        OpenAI Batch API or a streamed completion, and finished with
+        complete_request.
+        
+        Returns:
+            dict: "feedback" holds the result when no request is needed, because
+                it is cached or the answer can be graded locally. Otherwise
+                "options" holds the chat completion arguments, "parse" builds
+                the feedback from the response content, "escalation" gives the
+                arguments for scoring it again with the larger model or None,
+                "store" caches the final feedback and returns it and
+                "fallback" builds template feedback when the request fails
+        """
+        cached = self.cache.get(self._cache_key(question, user_answer))
+        if cached is not None:
+            return {"feedback": cached}
+        
+        question_type = question.get("type", "multiple_choice")
+        escalation = lambda result: None
+        
+        if question_type == "fill_in_the_blank":
+            result_type = self._match_fill_in_blank(question, user_answer)
+            # The stored explanation covers correct and nearly correct answers,
+            # so the API is only asked about wrong ones
+            if result_type != "incorrect":
+                return {"feedback": self._fill_in_blank_fallback(question, user_answer, result_type, original_explanation)}
+            
+            similar = self._get_semantic_feedback(question, user_answer, result_type)
+            if similar is not None:
+                return {"feedback": similar}
+            
+            options = self._fill_in_blank_options(question, user_answer, result_type, original_explanation, context_text)
+            parse = lambda content: self._parse_fill_in_blank_feedback(content, question, user_answer, result_type, original_explanation)
+            fallback = lambda: self._fill_in_blank_fallback(question, user_answer, result_type, original_explanation)
         
         elif question_type == "short_answer":
             # For short answers, use AI to evaluate the answer against key points
-            return self._evaluate_short_answer(question, user_answer, original_explanation, context_text)
+            feedback = (self._short_circuit_feedback(question, user_answer, original_explanation)
+                        or self._get_semantic_feedback(question, user_answer))
+            if feedback is not None:
+                return {"feedback": feedback}
+            
+            options = self._short_answer_options(question, user_answer, original_explanation, context_text)
+            parse = lambda content: self._parse_short_answer_feedback(content, question, original_explanation)
+            escalation = lambda result: (
+                self._short_answer_options(question, user_answer, original_explanation, context_text, ESCALATION_MODEL)
+                if self._needs_escalation(result) else None
+            )
+            fallback = lambda: self._short_answer_fallback(question, user_answer, original_explanation)
         
         else:
-            # Default to multiple choice behavior
-            is_correct = user_answer == question.get("correct_answer")
-            return self._generate_multiple_choice_feedback(question, user_answer, is_correct, original_explanation, context_text)
+            # Multiple choice, which is also the default behavior
+            is_correct = self._match_multiple_choice(question, user_answer)
+            # The stored explanation already says why a correct choice is right
+            if is_correct and original_explanation:
+                return {"feedback": self._multiple_choice_template(question, user_answer, is_correct, original_explanation)}
+            
+            options = self._multiple_choice_options(question, user_answer, is_correct, original_explanation, context_text)
+            parse = lambda content: self._parse_multiple_choice_feedback(content, question, user_answer, is_correct, original_explanation)
+            fallback = lambda: self._multiple_choice_fallback(question, is_correct, original_explanation)
+        
+        return {
+            "feedback": None,
+            "options": options,
+            "parse": parse,
+            "escalation": escalation,
+            "store": lambda result: self._cache_feedback(question, user_answer, result),
+            "fallback": fallback
+        }
     
-    def _generate_multiple_choice_feedback(self, question, user_answer, is_correct, original_explanation, context_text):
-        """Generate feedback for multiple choice questions"""
-        try:
-            # Get the user's selected option text
-            user_option_text = next((opt.get('text') for opt in question.get('options', []) if opt.get('id') == user_answer), "Unknown option")
-            
-            # Get the correct option text
-            correct_option_text = next((opt.get('text') for opt in question.get('options', []) if opt.get('id') == question.get('correct_answer')), "Unknown option")
-            
-            # Extract the topic from the question for additional resources
-            question_topic = question.get('question_text', '')[:50]  # Use first 50 chars to determine topic
-            
-            # Create a prompt for feedback generation with additional resources
-            prompt = f"""
-            You are an educational assistant providing feedback on a multiple-choice question.
-            
-            Question: {question.get('question_text')}
-            
-            The user selected: "{user_option_text}"
-            
-            The correct answer is: "{correct_option_text}"
-            
-            Is the user correct? {"Yes" if is_correct else "No"}
-            
-            Original explanation: {original_explanation}
-            
-            Additional context from the video: {context_text or 'Not available'}
-            
-            Please provide personalized feedback that:
-            1. Uses a natural, conversational tone
-            2. Does NOT start with generic phrases like "That's not quite right" or "That's incorrect"
-            3. Explains why the correct answer is right and (if applicable) why the user's choice was wrong
-            4. Connects the explanation to relevant concepts from the video
-            5. Is encouraging and supportive
-            6. Is concise (2-4 sentences)
-            
-            Additionally, suggest 2-3 high-quality web resources (with URLs) where the user can learn more about this topic.
-            These should be reputable sources like educational websites, documentation, or well-known blogs.
-            
-            Format your response as a JSON object with the following structure:
-            {{
-                "feedback": "Your detailed, conversational feedback here",
-                "additional_resources": [
-                    {{
-                        "title": "Resource Title 1",
-                        "url": "https://example.com/resource1",
-                        "description": "Brief description of this resource"
-                    }},
-                    {{
-                        "title": "Resource Title 2",
-                        "url": "https://example.com/resource2",
-                        "description": "Brief description of this resource"
-                    }}
-                ]
-            }}
-            
-            IMPORTANT:
-            - Do not use numbered lists or points in your feedback
-            - Do not use phrases like "Feedback:" or other labels
-            - Vary your language and avoid repetitive phrasing
-            - Don't just restate the original explanation - provide additional insight
-            - For educational resources, select a diverse set of high-quality links
-            - Make sure URLs are valid and point to legitimate educational resources
-            """
-            
-            # Call OpenAI API for feedback
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are an educational assistant providing natural, varied, and conversational feedback on quiz answers."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"}
-            )
-            
-            result = json.loads(response.choices[0].message.content)
-            feedback = result.get("feedback", "")
-            additional_resources = result.get("additional_resources", [])
-            
-            # Check if the feedback is empty or too short
-            if not feedback or len(feedback) < 20:
-                # Fall back to template-based feedback
-                feedback = self._generate_template_feedback(is_correct, original_explanation, question.get('correct_answer'), user_option_text, correct_option_text)
-                additional_resources = self._generate_fallback_resources(question_topic)
-            
-            return {
-                "is_correct": is_correct,
-                "correct_answer": question.get('correct_answer'),
-                "explanation": original_explanation,
-                "enhanced_feedback": feedback,
-                "additional_resources": additional_resources,
-                "question_id": question.get('question_id'),
-                "timestamp_start": question.get('timestamp_start'),
-                "timestamp_end": question.get('timestamp_end'),
-                "video_id": question.get('video_id')
-            }
-            
-        except Exception as e:
-            print(f"Error generating feedback for multiple choice: {str(e)}")
-            # Fall back to simple template
-            feedback = self._generate_template_feedback(
-                is_correct, 
-                original_explanation, 
-                question.get('correct_answer', ''), 
-                "your answer", 
-                "the correct answer"
-            )
-            
-            fallback_resources = self._generate_fallback_resources(question.get('question_text', '')[:50])
+    def complete_request(self, request, content):
+        """Build and cache the feedback for a request from its response content
+        
+        Borderline short answer scores are first scored again by the larger
+        model, keeping the first score if that call fails.
+        
+        Args:
+            request (dict): A request from feedback_request
+            content (str): Content of the API response
             
-            return {
-                "is_correct": is_correct,
-                "correct_answer": question.get('correct_answer'),
-                "explanation": original_explanation,
-                "enhanced_feedback": feedback,
-                "additional_resources": fallback_resources,
-                "question_id": question.get('question_id'),
-                "timestamp_start": question.get('timestamp_start'),
-                "timestamp_end": question.get('timestamp_end'),
-                "video_id": question.get('video_id')
-            }
-    
-    def _generate_fill_in_blank_feedback(self, question, user_answer, result_type, original_explanation, context_text):
-        """Generate feedback for fill in the blank questions"""
+        Returns:
+            dict: The feedback
+        """
+        result = request["parse"](content)
+        
+        escalation = request["escalation"](result)
+        if escalation is not None:
+            try:
+                response = get_client().chat.completions.create(**escalation)
+                result = request["parse"](response.choices[0].message.content)
+            except Exception as e:
+                log.error("Error rescoring short answer: %s", e)
+        
+        return request["store"](result)
+    
+    async def acomplete_request(self, request, content):
+        """Build and cache the feedback for a request without blocking the event loop
+        
+        Takes the same arguments and returns the same result as complete_request.
+        """
+        result = request["parse"](content)
+        
+        escalation = request["escalation"](result)
+        if escalation is not None:
+            try:
+                response = await acreate_completion(**escalation)
+                result = request["parse"](response.choices[0].message.content)
+            except Exception as e:
+                log.error("Error rescoring short answer: %s", e)
+        
+        return await asyncio.to_thread(request["store"], result)
+    
+    def stream_feedback(self, question, user_answer, original_explanation, context_text=None):
+        """Generate feedback, yielding the feedback text as soon as the model has written it
+        
+        Takes the same arguments as generate_feedback.
+        
+        Yields:
+            dict: {"enhanced_feedback": ...} once the feedback field of the
+                response is complete, while the resources are still being
+                generated, then {"result": ...} with the full feedback
+        """
+        request = self.feedback_request(question, user_answer, original_explanation, context_text)
+        if request["feedback"] is not None:
+            yield {"result": request["feedback"]}
+            return
+        
         try:
-            correct_answer = question.get('correct_answer', '')
-            
-            # Extract the topic from the question for additional resources
-            question_topic = question.get('question_text', '')[:50]  # Use first 50 chars to determine topic
-            
-            prompt = f"""
-            You are an educational assistant providing feedback on a fill-in-the-blank question.
-            
-            Question: {question.get('question_text')}
-            
-            The user answered: "{user_answer}"
-            
-            The correct answer is: "{correct_answer}"
-            
-            Result: {"Correct" if result_type == "correct" else "Partial match" if result_type == "partial" else "Incorrect"}
-            
-            Original explanation: {original_explanation}
-            
-            Additional context from the video: {context_text or 'Not available'}
-            
-            Please provide personalized feedback that:
-            1. Uses a natural, conversational tone
-            2. Acknowledges if the answer was correct, partially correct, or incorrect
-            3. Explains the correct answer and any nuances in wording that might be important
-            4. Connects the explanation to relevant concepts from the video
-            5. Is encouraging and supportive
-            6. Is concise (2-4 sentences)
-            
-            Additionally, suggest 2-3 high-quality web resources (with URLs) where the user can learn more about this topic.
-            These should be reputable sources like educational websites, documentation, or well-known blogs.
-            
-            Format your response as a JSON object with the following structure:
-            {{
-                "feedback": "Your detailed, conversational feedback here",
-                "additional_resources": [
-                    {{
-                        "title": "Resource Title 1",
-                        "url": "https://example.com/resource1",
-                        "description": "Brief description of this resource"
-                    }},
-                    {{
-                        "title": "Resource Title 2",
-                        "url": "https://example.com/resource2",
-                        "description": "Brief description of this resource"
-                    }}
-                ]
-            }}
-            """
-            
-            # Call OpenAI API for feedback
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are an educational assistant providing feedback on fill-in-the-blank questions."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"}
-            )
-            
-            result = json.loads(response.choices[0].message.content)
-            feedback = result.get("feedback", "")
-            additional_resources = result.get("additional_resources", [])
-            
-            is_correct = result_type == "correct"
-            
-            # If the feedback is missing or too short, use template fallback
-            if not feedback or len(feedback) < 20:
-                if is_correct:
-                    feedback = f"{random.choice(self.correct_starters)} You correctly filled in the blank with '{question.get('correct_answer')}'."
-                elif result_type == "partial":
-                    feedback = f"Your answer '{user_answer}' is close to the correct answer '{question.get('correct_answer')}'. {original_explanation}"
-                else:
-                    feedback = f"{random.choice(self.incorrect_starters)} The correct answer is '{question.get('correct_answer')}'. {original_explanation}"
+            stream = get_client().chat.completions.create(**request["options"], stream=True)
+            
+            content = ""
+            feedback_sent = False
+            for chunk in stream:
+                if not chunk.choices or not chunk.choices[0].delta.content:
+                    continue
+                content += chunk.choices[0].delta.content
                 
-                additional_resources = self._generate_fallback_resources(question_topic)
-            
-            return {
-                "is_correct": is_correct,
-                "is_partial": result_type == "partial",
-                "correct_answer": correct_answer,
-                "explanation": original_explanation,
-                "enhanced_feedback": feedback,
-                "additional_resources": additional_resources,
-                "question_id": question.get('question_id'),
-                "timestamp_start": question.get('timestamp_start'),
-                "timestamp_end": question.get('timestamp_end'),
-                "video_id": question.get('video_id')
-            }
-            
+                match = None if feedback_sent else FEEDBACK_FIELD_PATTERN.search(content)
+                if match:
+                    feedback_sent = True
+                    feedback = orjson.loads(match.group(1))
+                    # Feedback this short is replaced with a template once parsed
+                    if len(feedback) >= 20:
+                        yield {"enhanced_feedback": feedback}
+            
+            result = self.complete_request(request, content)
+        
         except Exception as e:
-            print(f"Error generating feedback for fill in the blank: {str(e)}")
-            
-            # Determine if it's correct or partial
-            is_correct = result_type == "correct"
-            is_partial = result_type == "partial"
-            
-            if is_correct:
-                feedback = f"{random.choice(self.correct_starters)} You correctly filled in the blank with '{question.get('correct_answer')}'."
-            elif is_partial:
-                feedback = f"Your answer '{user_answer}' is close to the correct answer '{question.get('correct_answer')}'. {original_explanation}"
-            else:
-                feedback = f"{random.choice(self.incorrect_starters)} The correct answer is '{question.get('correct_answer')}'. {original_explanation}"
-            
-            fallback_resources = self._generate_fallback_resources(question.get('question_text', '')[:50])
-            
-            return {
-                "is_correct": is_correct,
-                "is_partial": is_partial,
-                "correct_answer": question.get('correct_answer'),
-                "explanation": original_explanation,
-                "enhanced_feedback": feedback,
-                "additional_resources": fallback_resources,
-                "question_id": question.get('question_id'),
-                "timestamp_start": question.get('timestamp_start'),
-                "timestamp_end": question.get('timestamp_end'),
-                "video_id": question.get('video_id')
-            }
-    
-    def _evaluate_short_answer(self, question, user_answer, original_explanation, context_text):
-        """Evaluate a short answer response using AI"""
-        try:
-            key_points = question.get('key_points', [])
-            sample_answer = question.get('sample_answer', '')
-            
-            # Extract the topic from the question for additional resources
-            question_topic = question.get('question_text', '')[:50]  # Use first 50 chars to determine topic
-            
-            # Check if the answer is too short or nonsensical (like "grb")
-            if len(user_answer.strip()) < 5 or (user_answer.strip().isalpha() and len(user_answer.strip()) < 4):
-                # This is likely a non-serious answer or random characters
-                fallback_resources = self._generate_fallback_resources(question_topic)
-                
-                return {
-                    "is_correct": False,
-                    "is_partial": False,
-                    "score_percentage": 0,  # Give 0% for obviously incorrect/minimal answers
-                    "correct_answer": sample_answer,
-                    "key_points": key_points,
-                    "explanation": original_explanation,
-                    "enhanced_feedback": f"Your answer is too brief to assess properly. A good response should include: {', '.join(key_points)}. {original_explanation}",
-                    "additional_resources": fallback_resources,
-                    "question_id": question.get('question_id'),
-                    "timestamp_start": question.get('timestamp_start'),
-                    "timestamp_end": question.get('timestamp_end'),
-                    "video_id": question.get('video_id')
-                }
-            
-            key_points_text = "\n".join([f"- {point}" for point in key_points])
-            
-            prompt = f"""
-            You are an educational assistant evaluating a short answer response.
-            
-            Question: {question.get('question_text')}
-            
-            Student's answer: "{user_answer}"
-            
-            Sample correct answer: "{sample_answer}"
-            
-            Key points that should be included:
-            {key_points_text}
-            
-            Original explanation of what makes a good answer: {original_explanation}
-            
-            Additional context from the video: {context_text or 'Not available'}
-            
-            Please evaluate the student's answer on a scale of 0-100%, where:
-            - 0-10%: Very minimal, irrelevant, or nonsensical answer
-            - 11-30%: Missing nearly all key points, major misconceptions
-            - 31-50%: Includes at least one key point but has significant gaps
-            - 51-70%: Includes some key points with minor misconceptions
-            - 71-90%: Includes most key points with minor issues
-            - 91-100%: Includes all key points and demonstrates thorough understanding
-            
-            VERY IMPORTANT: If the answer is very short (less than 10 words) and doesn't address any of the key points, give a score under 20%.
-            
-            Additionally, suggest 2-3 high-quality web resources (with URLs) where the user can learn more about this topic.
-            These should be reputable sources like educational websites, documentation, or well-known blogs.
-            
-            Format your response as a JSON object with the following structure:
-            {{
-                "score_percentage": 85,
-                "feedback": "Your detailed, conversational feedback here",
-                "additional_resources": [
-                    {{
-                        "title": "Resource Title 1",
-                        "url": "https://example.com/resource1",
-                        "description": "Brief description of this resource"
-                    }},
-                    {{
-                        "title": "Resource Title 2",
-                        "url": "https://example.com/resource2",
-                        "description": "Brief description of this resource"
-                    }}
-                ]
-            }}
-            """
+            log.error("Error streaming feedback: %s", e)
+            result = request["fallback"]()
+        
+        yield {"result": result}
+    
+    def generate_quick_feedback(self, question, user_answer, original_explanation):
+        """Generate template feedback for answers that can be checked without the API
+        
+        Multiple choice and fill in the blank answers are graded by comparing
+        against the stored correct answer, and the stored explanation already
+        covers why it is correct.
+        
+        Args:
+            question (dict): The question object
+            user_answer (str): The user's answer
+            original_explanation (str): The explanation provided with the question
             
-            # Call OpenAI API for evaluation
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are an educational assistant evaluating short answer responses."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"}
+        Returns:
+            dict: Feedback in the same shape as generate_feedback, or None for
+                question types that need AI evaluation
+        """
+        question_type = question.get("type", "multiple_choice")
+        
+        if question_type == "short_answer":
+            return None
+        
+        if question_type == "fill_in_the_blank":
+            result_type = self._match_fill_in_blank(question, user_answer)
+            return self._fill_in_blank_fallback(question, user_answer, result_type, original_explanation)
+        
+        is_correct = self._match_multiple_choice(question, user_answer)
+        return self._multiple_choice_template(question, user_answer, is_correct, original_explanation)
+    
+    def _cache_key(self, question, user_answer):
+        """Key feedback by the question and the normalized answer"""
+        return self.cache.make_key(
+            qid=question.get("question_id"),
+            type=question.get("type", "multiple_choice"),
+            ans=str(user_answer).strip().lower()
+        )
+    
+    def _semantic_scope(self, question, grade=None):
+        """Group feedback by question, and by grade where the grade is decided
+        locally, so a similar answer never gets feedback for a different grade
+        """
+        return (question.get("question_id"), grade)
+    
+    def _get_semantic_feedback(self, question, user_answer, grade=None):
+        """Get the feedback cached for the most similar earlier answer, if any"""
+        if self.semantic_cache is None:
+            return None
+        
+        vector = self.semantic_cache.embed(f"{question.get('question_text')}\n{user_answer}")
+        if vector is None:
+            return None
+        
+        result = self.semantic_cache.get(self._semantic_scope(question, grade), vector)
+        if result is not None:
+            # The same answer is served from the exact-match cache next time
+            self.cache.set(self._cache_key(question, user_answer), result)
+        
+        return result
+    
+    def _cache_feedback(self, question, user_answer, result):
+        """Cache feedback generated by the API and return it"""
+        self.cache.set(self._cache_key(question, user_answer), result)
+        
+        question_type = question.get("type", "multiple_choice")
+        if self.semantic_cache is not None and question_type in ("fill_in_the_blank", "short_answer"):
+            grade = None
+            if question_type == "fill_in_the_blank":
+                grade = "correct" if result.get("is_correct") else "partial" if result.get("is_partial") else "incorrect"
+            
+            vector = self.semantic_cache.embed(f"{question.get('question_text')}\n{user_answer}")
+            if vector is not None:
+                self.semantic_cache.set(self._semantic_scope(question, grade), vector, result)
+        
+        return result
+    
+    def _match_multiple_choice(self, question, user_answer):
+        """Check a multiple choice answer, ignoring case and surrounding whitespace"""
+        correct_answer = question.get("correct_answer") or ""
+        return str(user_answer).strip().upper() == str(correct_answer).strip().upper()
+    
+    def _match_fill_in_blank(self, question, user_answer):
+        """Check a fill in the blank answer
+        
+        Returns:
+            str: "correct", "partial" or "incorrect"
+        """
+        # For fill in the blank, do more fuzzy matching
+        user_answer_normalized = user_answer.strip().lower()
+        correct_answer_normalized = (question.get("correct_answer") or "").strip().lower()
+        
+        # Check for exact match or close match
+        if user_answer_normalized == correct_answer_normalized:
+            return "correct"
+        
+        # Misspellings of the correct answer are close to it by edit distance
+        similarity = self._similarity(user_answer_normalized, correct_answer_normalized)
+        if similarity >= TYPO_SIMILARITY:
+            return "correct"
+        if similarity >= PARTIAL_SIMILARITY:
+            return "partial"
+        
+        # If it's not a close match, check if it's a substring or if correct answer is a substring
+        if user_answer_normalized and (user_answer_normalized in correct_answer_normalized or correct_answer_normalized in user_answer_normalized):
+            return "partial"
+        
+        return "incorrect"
+    
+    def _similarity(self, a, b):
+        """Get the edit distance similarity of two strings, from 0 to 100"""
+        if fuzz_ratio is not None:
+            return fuzz_ratio(a, b)
+        return difflib.SequenceMatcher(None, a, b).ratio() * 100
+    
+    def _option_texts(self, question, *option_ids):
+        """Get the texts of multiple choice options by their IDs
+        
+        The options are indexed once, so each ID is looked up directly
+        """
+        texts = {opt.get('id'): opt.get('text') for opt in question.get('options') or ()}
+        return tuple(texts.get(option_id, "Unknown option") for option_id in option_ids)
+    
+    def _multiple_choice_options(self, question, user_answer, is_correct, original_explanation, context_text):
+        """Build the chat completion arguments for multiple choice feedback"""
+        user_option_text, correct_option_text = self._option_texts(question, user_answer, question.get('correct_answer'))
+        
+        prompt = f"""
+        Question: {question.get('question_text')}
+        
+        The user selected: "{user_option_text}"
+        
+        The correct answer is: "{correct_option_text}"
+        
+        Is the user correct? {"Yes" if is_correct else "No"}
+        
+        Original explanation: {original_explanation}
+        
+        Additional context from the video: {context_text or 'Not available'}
+        """
+        
+        return self._feedback_options(MULTIPLE_CHOICE_SYSTEM_PROMPT, prompt)
+    
+    def _parse_multiple_choice_feedback(self, content, question, user_answer, is_correct, original_explanation):
+        """Build multiple choice feedback from the content of an API response"""
+        result = orjson.loads(content)
+        feedback = result.get("feedback", "")
+        additional_resources = result.get("additional_resources", [])
+        
+        # Check if the feedback is empty or too short
+        if not feedback or len(feedback) < 20:
+            # Fall back to template-based feedback
+            feedback = self._generate_template_feedback(
+                is_correct,
+                original_explanation,
+                question.get('correct_answer'),
+                *self._option_texts(question, user_answer, question.get('correct_answer'))
             )
+            # Use first 50 chars of the question to determine the topic
+            additional_resources = self._generate_fallback_resources(question.get('question_text', '')[:50])
+        
+        return {
+            "is_correct": is_correct,
+            "correct_answer": question.get('correct_answer'),
+            "explanation": original_explanation,
+            "enhanced_feedback": feedback,
+            "additional_resources": additional_resources,
+            "question_id": question.get('question_id'),
+            "timestamp_start": question.get('timestamp_start'),
+            "timestamp_end": question.get('timestamp_end'),
+            "video_id": question.get('video_id')
+        }
+    
+    def _multiple_choice_template(self, question, user_answer, is_correct, original_explanation):
+        """Build template feedback for multiple choice questions naming the chosen options"""
+        feedback = self._generate_template_feedback(
+            is_correct,
+            original_explanation,
+            question.get('correct_answer'),
+            *self._option_texts(question, user_answer, question.get('correct_answer'))
+        )
+        
+        fallback_resources = self._generate_fallback_resources(question.get('question_text', '')[:50])
+        
+        return {
+            "is_correct": is_correct,
+            "correct_answer": question.get('correct_answer'),
+            "explanation": original_explanation,
+            "enhanced_feedback": feedback,
+            "additional_resources": fallback_resources,
+            "question_id": question.get('question_id'),
+            "timestamp_start": question.get('timestamp_start'),
+            "timestamp_end": question.get('timestamp_end'),
+            "video_id": question.get('video_id')
+        }
+    
+    def _multiple_choice_fallback(self, question, is_correct, original_explanation):
+        """Build template feedback for multiple choice questions when the API call fails"""
+        feedback = self._generate_template_feedback(
+            is_correct, 
+            original_explanation, 
+            question.get('correct_answer', ''), 
+            "your answer", 
+            "the correct answer"
+        )
+        
+        fallback_resources = self._generate_fallback_resources(question.get('question_text', '')[:50])
+        
+        return {
+            "is_correct": is_correct,
+            "correct_answer": question.get('correct_answer'),
+            "explanation": original_explanation,
+            "enhanced_feedback": feedback,
+            "additional_resources": fallback_resources,
+            "question_id": question.get('question_id'),
+            "timestamp_start": question.get('timestamp_start'),
+            "timestamp_end": question.get('timestamp_end'),
+            "video_id": question.get('video_id')
+        }
+    
+    def _fill_in_blank_options(self, question, user_answer, result_type, original_explanation, context_text):
+        """Build the chat completion arguments for fill in the blank feedback"""
+        prompt = f"""
+        Question: {question.get('question_text')}
+        
+        The user answered: "{user_answer}"
+        
+        The correct answer is: "{question.get('correct_answer', '')}"
+        
+        Result: {"Correct" if result_type == "correct" else "Partial match" if result_type == "partial" else "Incorrect"}
+        
+        Original explanation: {original_explanation}
+        
+        Additional context from the video: {context_text or 'Not available'}
+        """
+        
+        return self._feedback_options(FILL_IN_BLANK_SYSTEM_PROMPT, prompt)
+    
+    def _parse_fill_in_blank_feedback(self, content, question, user_answer, result_type, original_explanation):
+        """Build fill in the blank feedback from the content of an API response"""
+        result = orjson.loads(content)
+        feedback = result.get("feedback", "")
+        additional_resources = result.get("additional_resources", [])
+        
+        # If the feedback is missing or too short, use template fallback
+        if not feedback or len(feedback) < 20:
+            feedback = self._generate_fill_in_blank_template(question, user_answer, result_type, original_explanation)
+            # Use first 50 chars of the question to determine the topic
+            additional_resources = self._generate_fallback_resources(question.get('question_text', '')[:50])
+        
+        return {
+            "is_correct": result_type == "correct",
+            "is_partial": result_type == "partial",
+            "correct_answer": question.get('correct_answer', ''),
+            "explanation": original_explanation,
+            "enhanced_feedback": feedback,
+            "additional_resources": additional_resources,
+            "question_id": question.get('question_id'),
+            "timestamp_start": question.get('timestamp_start'),
+            "timestamp_end": question.get('timestamp_end'),
+            "video_id": question.get('video_id')
+        }
+    
+    def _fill_in_blank_fallback(self, question, user_answer, result_type, original_explanation):
+        """Build template feedback for fill in the blank questions, used when
+        the API isn't needed or the call fails
+        """
+        # Determine if it's correct or partial
+        is_correct = result_type == "correct"
+        is_partial = result_type == "partial"
+        
+        feedback = self._generate_fill_in_blank_template(question, user_answer, result_type, original_explanation)
+        
+        fallback_resources = self._generate_fallback_resources(question.get('question_text', '')[:50])
+        
+        return {
+            "is_correct": is_correct,
+            "is_partial": is_partial,
+            "correct_answer": question.get('correct_answer'),
+            "explanation": original_explanation,
+            "enhanced_feedback": feedback,
+            "additional_resources": fallback_resources,
+            "question_id": question.get('question_id'),
+            "timestamp_start": question.get('timestamp_start'),
+            "timestamp_end": question.get('timestamp_end'),
+            "video_id": question.get('video_id')
+        }
+    
+    def _needs_escalation(self, result):
+        """Check if a short answer score is borderline enough to be scored again
+        by the larger model
+        """
+        score = result.get("score_percentage")
+        return bool(ESCALATION_MODEL) and isinstance(score, (int, float)) and ESCALATION_MIN_SCORE <= score <= ESCALATION_MAX_SCORE
+    
+    def _short_circuit_feedback(self, question, user_answer, original_explanation):
+        """Grade short answers that clearly don't need AI evaluation
+        
+        Returns:
+            dict: Feedback for answers that are too brief, copy the question
+                or say the learner doesn't know, or None if the answer should
+                be evaluated
+        """
+        answer = user_answer.strip()
+        key_points = question.get('key_points', [])
+        key_points_text = ', '.join(key_points)
+        
+        # Check if the answer is too short or nonsensical (like "grb")
+        if len(answer) < 5 or (answer.isalpha() and len(answer) < 4):
+            score = 0
+            feedback = f"Your answer is too brief to assess properly. A good response should include: {key_points_text}. {original_explanation}"
+        
+        elif " ".join(re.findall(r"\w+", answer.lower())) == " ".join(re.findall(r"\w+", question.get('question_text', '').lower())):
+            score = 0
+            feedback = f"Your answer repeats the question. Please answer in your own words; a good response should include: {key_points_text}. {original_explanation}"
+        
+        elif NON_ANSWER_PATTERN.match(answer):
+            score = 0
+            feedback = f"Your answer doesn't attempt the question. A good response should include: {key_points_text}. {original_explanation}"
+        
+        else:
+            return None
+        
+        return {
+            "is_correct": False,
+            "is_partial": False,
+            "score_percentage": score,
+            "correct_answer": question.get('sample_answer', ''),
+            "key_points": key_points,
+            "explanation": original_explanation,
+            "enhanced_feedback": feedback,
+            "additional_resources": self._generate_fallback_resources(question.get('question_text', '')[:50]),
+            "question_id": question.get('question_id'),
+            "timestamp_start": question.get('timestamp_start'),
+            "timestamp_end": question.get('timestamp_end'),
+            "video_id": question.get('video_id')
+        }
+    
+    def _short_answer_options(self, question, user_answer, original_explanation, context_text, model=FEEDBACK_MODEL):
+        """Build the chat completion arguments for evaluating a short answer"""
+        key_points_text = "\n".join([f"- {point}" for point in question.get('key_points', [])])
+        
+        prompt = f"""
+        Question: {question.get('question_text')}
+        
+        Student's answer: "{user_answer}"
+        
+        Sample correct answer: "{question.get('sample_answer', '')}"
+        
+        Key points that should be included:
+        {key_points_text}
+        
+        Original explanation of what makes a good answer: {original_explanation}
+        
+        Additional context from the video: {context_text or 'Not available'}
+        """
+        
+        # The score and reasoning need more room than the other feedback
+        return self._feedback_options(SHORT_ANSWER_SYSTEM_PROMPT, prompt, model, max_tokens=500)
+    
+    def _feedback_options(self, system_prompt, prompt, model=FEEDBACK_MODEL, max_tokens=350):
+        """Build the chat completion arguments for a feedback prompt
+        
+        Sampling is deterministic, so the same answer gets the same feedback
+        whether it is cached or not, and the output is capped so a drifting
+        response ends early
+        """
+        return {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            "response_format": {"type": "json_object"},
+            "temperature": 0,
+            "top_p": 1,
+            "seed": 42,
+            "max_tokens": max_tokens
+        }
+    
+    def _parse_short_answer_feedback(self, content, question, original_explanation):
+        """Build short answer feedback from the content of an API response"""
+        result = orjson.loads(content)
+        
+        score = result.get("score_percentage", 0)
+        feedback = result.get("feedback", "")
+        additional_resources = result.get("additional_resources", [])
+        
+        # Determine if it's correct based on score threshold
+        is_correct = score >= 75  # Consider 75% or higher as correct
+        is_partial = 30 <= score < 75  # Consider 30-74% as partially correct
+        
+        return {
+            "is_correct": is_correct,
+            "is_partial": is_partial,
+            "score_percentage": score,
+            "correct_answer": question.get('sample_answer', ''),
+            "key_points": question.get('key_points', []),
+            "explanation": original_explanation,
+            "enhanced_feedback": feedback,
+            "additional_resources": additional_resources,
+            "question_id": question.get('question_id'),
+            "timestamp_start": question.get('timestamp_start'),
+            "timestamp_end": question.get('timestamp_end'),
+            "video_id": question.get('video_id')
+        }
+    
+    def _short_answer_fallback(self, question, user_answer, original_explanation):
+        """Score a short answer by keyword matching when the API call fails"""
+        # Analyze the answer length
+        if len(user_answer.strip()) < 5:
+            score = 0
+            feedback = f"Your answer is too brief. A good response should include: {', '.join(question.get('key_points', []))}. {original_explanation}"
+        else:
+            # Better fallback scoring - doing basic word matching with key points
+            # Each key point is checked with one scan of the answer
+            score = 0
+            answer = user_answer.lower()
+            patterns = [key_point_pattern(point) for point in question.get('key_points', [])]
+            matched_points = sum(1 for pattern in patterns if pattern is not None and pattern.search(answer))
             
-            result = json.loads(response.choices[0].message.content)
-            
-            score = result.get("score_percentage", 0)
-            feedback = result.get("feedback", "")
-            additional_resources = result.get("additional_resources", [])
-            
-            # Determine if it's correct based on score threshold
-            is_correct = score >= 75  # Consider 75% or higher as correct
-            is_partial = 30 <= score < 75  # Consider 30-74% as partially correct
-            
-            return {
-                "is_correct": is_correct,
-                "is_partial": is_partial,
-                "score_percentage": score,
-                "correct_answer": sample_answer,
-                "key_points": key_points,
-                "explanation": original_explanation,
-                "enhanced_feedback": feedback,
-                "additional_resources": additional_resources,
-                "question_id": question.get('question_id'),
-                "timestamp_start": question.get('timestamp_start'),
-                "timestamp_end": question.get('timestamp_end'),
-                "video_id": question.get('video_id')
-            }
-            
-        except Exception as e:
-            print(f"Error evaluating short answer: {str(e)}")
-            
-            # Analyze the answer length
-            if len(user_answer.strip()) < 5:
-                score = 0
-                feedback = f"Your answer is too brief. A good response should include: {', '.join(question.get('key_points', []))}. {original_explanation}"
-            else:
-                # Better fallback scoring - doing basic word matching with key points
-                score = 0
-                matched_points = 0
-                for point in question.get('key_points', []):
-                    keywords = [word.lower() for word in point.split() if len(word) > 3]
-                    for keyword in keywords:
-                        if keyword in user_answer.lower():
-                            matched_points += 1
-                            break
-                
-                if matched_points > 0:
-                    score = min(70, int(matched_points / len(question.get('key_points', [])) * 60))
-                
-                feedback = f"Based on keyword matching, your answer addresses approximately {score}% of the key points. A complete answer should include: {', '.join(question.get('key_points', []))}. {original_explanation}"
-            
-            fallback_resources = self._generate_fallback_resources(question.get('question_text', '')[:50])
+            if matched_points > 0:
+                score = min(70, int(matched_points / len(question.get('key_points', [])) * 60))
             
-            return {
-                "is_correct": score >= 75,
-                "is_partial": 30 <= score < 75,
-                "score_percentage": score,
-                "correct_answer": question.get('sample_answer', ''),
-                "key_points": question.get('key_points', []),
-                "explanation": original_explanation,
-                "enhanced_feedback": feedback,
-                "additional_resources": fallback_resources,
-                "question_id": question.get('question_id'),
-                "timestamp_start": question.get('timestamp_start'),
-                "timestamp_end": question.get('timestamp_end'),
-                "video_id": question.get('video_id')
-            }
+            feedback = f"Based on keyword matching, your answer addresses approximately {score}% of the key points. A complete answer should include: {', '.join(question.get('key_points', []))}. {original_explanation}"
+        
+        fallback_resources = self._generate_fallback_resources(question.get('question_text', '')[:50])
+        
+        return {
+            "is_correct": score >= 75,
+            "is_partial": 30 <= score < 75,
+            "score_percentage": score,
+            "correct_answer": question.get('sample_answer', ''),
+            "key_points": question.get('key_points', []),
+            "explanation": original_explanation,
+            "enhanced_feedback": feedback,
+            "additional_resources": fallback_resources,
+            "question_id": question.get('question_id'),
+            "timestamp_start": question.get('timestamp_start'),
+            "timestamp_end": question.get('timestamp_end'),
+            "video_id": question.get('video_id')
+        }
     
     def _generate_template_feedback(self, is_correct, original_explanation, correct_answer_id, user_option_text, correct_option_text):
         """Generate feedback using templates when API call fails"""
         if is_correct:
-            starter = random.choice(self.correct_starters)
+            starter = random.choice(CORRECT_STARTERS)
             return f"{starter} {original_explanation}"
         else:
-            starter = random.choice(self.incorrect_starters)
+            starter = random.choice(INCORRECT_STARTERS)
             return f"{starter} The correct answer is {correct_answer_id} ({correct_option_text}). {original_explanation}"
     
+    def _generate_fill_in_blank_template(self, question, user_answer, result_type, original_explanation):
+        """Generate fill in the blank feedback using templates when API call fails"""
+        if result_type == "correct":
+            return f"{random.choice(CORRECT_STARTERS)} You correctly filled in the blank with '{question.get('correct_answer')}'."
+        elif result_type == "partial":
+            return f"Your answer '{user_answer}' is close to the correct answer '{question.get('correct_answer')}'. {original_explanation}"
+        else:
+            return f"{random.choice(INCORRECT_STARTERS)} The correct answer is '{question.get('correct_answer')}'. {original_explanation}"
+    
     def _generate_fallback_resources(self, topic):
         """Generate fallback resources when API call fails or returns insufficient data"""
-        # General educational resources for various topics
-        general_resources = [
-            {
-                "title": "Khan Academy",
-                "url": "https://www.khanacademy.org/",
-                "description": "Free educational resources across many subjects with video lessons and practice exercises."
-            },
-            {
-                "title": "MIT OpenCourseWare",
-                "url": "https://ocw.mit.edu/",
-                "description": "Free course materials from MIT covering a wide range of subjects."
-            },
-            {
-                "title": "Coursera",
-                "url": "https://www.coursera.org/",
-                "description": "Online courses from top universities and companies across many disciplines."
-            },
-            {
-                "title": "edX",
-                "url": "https://www.edx.org/",
-                "description": "Online courses from leading educational institutions on a variety of topics."
-            },
-            {
-                "title": "MDN Web Docs",
-                "url": "https://developer.mozilla.org/",
-                "description": "Comprehensive documentation for web technologies and programming."
-            },
-            {
-                "title": "W3Schools",
-                "url": "https://www.w3schools.com/",
-                "description": "Web development tutorials and reference materials with interactive examples."
-            },
-            {
-                "title": "Digital Ocean Community Tutorials",
-                "url": "https://www.digitalocean.com/community/tutorials",
-                "description": "Detailed technical tutorials on programming, software, and system administration."
-            }
-        ]
-        
-        # Select 2-3 resources at random (different ones each time)
-        selected_resources = random.sample(general_resources, min(3, len(general_resources)))
-        return selected_resources
\ No newline at end of file
+        # Select 2-3 resources at random (different ones each time). They are
+        # copied so callers can't change the shared ones
+        selected_resources = random.sample(GENERAL_RESOURCES, min(3, len(GENERAL_RESOURCES)))
+        return [dict(resource) for resource in selected_resources]
\ No newline at end of file
@@ -0,0 +1,107 @@
+# app/utils/llm_cache.py
+import hashlib
+import logging
+import threading
+import orjson
+from cachetools import TTLCache
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+log = logging.getLogger(__name__)
+
+class LLMCache:
+    """Exact-match cache for results parsed from LLM responses
+    
+    Results are kept in process memory by default. Given a Redis URL they
+    are stored in Redis instead, so every worker shares them. Given a cache
+    directory they are stored on disk, shared by the workers on one machine
+    and kept across restarts.
+    """
+    
+    def __init__(self, namespace, ttl=86400, maxsize=4096, redis_url=None, cache_dir=None, size_limit=2 << 30):
+        """Create a cache
+        
+        Args:
+            namespace (str): Prefix that keeps this cache's keys apart from others
+            ttl (int): Seconds a result stays cached
+            maxsize (int): Most results kept in memory
+            redis_url (str, optional): Redis server to store results in
+            cache_dir (str, optional): Directory to store results in when no
+                Redis server is given
+            size_limit (int): Most bytes stored in the cache directory; the
+                least recently used results are evicted first
+        """
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        self._memory = None
+        self._redis = None
+        self._disk = None
+        
+        if redis_url and redis is None:
+            log.warning("redis not installed, not caching LLM results in Redis. Install with: pip install redis")
+        if cache_dir and diskcache is None:
+            log.warning("diskcache not installed, not caching LLM results on disk. Install with: pip install diskcache")
+        
+        if redis_url and redis is not None:
+            self._redis = redis.Redis.from_url(redis_url)
+        elif cache_dir and diskcache is not None:
+            self._disk = diskcache.Cache(cache_dir, size_limit=size_limit, eviction_policy="least-recently-used")
+        else:
+            self._memory = TTLCache(maxsize=maxsize, ttl=ttl)
+    
+    def make_key(self, **fields):
+        """Build a cache key from the fields that determine a result"""
+        payload = orjson.dumps(fields, option=orjson.OPT_SORT_KEYS)
+        return f"{self.namespace}:{hashlib.sha256(payload).hexdigest()}"
+    
+    def get(self, key):
+        """Get a cached result, or None if there isn't one"""
+        if self._redis is not None:
+            try:
+                data = self._redis.get(key)
+            except redis.RedisError as e:
+                log.error("Error reading LLM cache: %s", e)
+                data = None
+            value = orjson.loads(data) if data is not None else None
+        elif self._disk is not None:
+            try:
+                value = self._disk.get(key)
+            except Exception as e:
+                log.error("Error reading LLM cache: %s", e)
+                value = None
+        else:
+            with self._lock:
+                value = self._memory.get(key)
+            # Callers may add to the result they get back
+            value = dict(value) if value is not None else None
+        
+        with self._lock:
+            self.stats["hits" if value is not None else "misses"] += 1
+        
+        return value
+    
+    def set(self, key, value):
+        """Cache a result"""
+        if self._redis is not None:
+            try:
+                self._redis.set(key, orjson.dumps(value), ex=self.ttl)
+            except redis.RedisError as e:
+                log.error("Error writing LLM cache: %s", e)
+        elif self._disk is not None:
+            try:
+                self._disk.set(key, value, expire=self.ttl)
+            except Exception as e:
+                log.error("Error writing LLM cache: %s", e)
+        else:
+            with self._lock:
+                self._memory[key] = dict(value)
@@ -0,0 +1,122 @@
+# app/utils/openai_client.py
+import asyncio
+import atexit
+import importlib.util
+import os
+import threading
+
+# The OpenAI SDK and the .env file are only loaded when a client is first
+# needed, so importing the modules that use them stays cheap
+
+# Every module goes through these clients, so TCP and TLS connections to
+# the API are kept alive and reused across requests
+HTTP_LIMITS = {"max_connections": 200, "max_keepalive_connections": 50}
+
+# A dead connection fails fast instead of waiting out the SDK's 10 minute
+# default. The read timeout applies between bytes, so it leaves time for a
+# large batch of questions
+HTTP_TIMEOUT = {"timeout": 120.0, "connect": 5.0}
+
+# With h2 installed, concurrent requests are multiplexed over one HTTP/2
+# connection instead of each holding its own
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+_client = None
+_client_lock = threading.Lock()
+
+# An async client's connection pool is bound to the event loop it runs on,
+# and Flask runs every async view on a new loop. The shared async client
+# therefore lives on one long-running loop in a background thread, and
+# coroutines on other loops hand their API calls to it
+_async_client = None
+_async_loop = None
+_async_lock = threading.Lock()
+
+def _load_env():
+    """Load environment variables from the .env file"""
+    from dotenv import load_dotenv
+    load_dotenv()
+
+def get_client():
+    """Get the shared OpenAI client for blocking calls, creating it on first use
+    
+    Returns:
+        OpenAI: Client shared by all threads
+    """
+    global _client
+    
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import httpx
+                from openai import DefaultHttpxClient, OpenAI
+                
+                _load_env()
+                _client = OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    timeout=httpx.Timeout(**HTTP_TIMEOUT),
+                    http_client=DefaultHttpxClient(limits=httpx.Limits(**HTTP_LIMITS), http2=HTTP2)
+                )
+    
+    return _client
+
+def _get_async_client():
+    """Get the shared AsyncOpenAI client and the loop it runs on, starting
+    them on first use
+    
+    Returns:
+        tuple: The AsyncOpenAI client and its event loop
+    """
+    global _async_client, _async_loop
+    
+    with _async_lock:
+        if _async_client is None:
+            import httpx
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+            
+            _load_env()
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="openai-async-client", daemon=True).start()
+            
+            _async_client = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                timeout=httpx.Timeout(**HTTP_TIMEOUT),
+                http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(**HTTP_LIMITS), http2=HTTP2)
+            )
+            _async_loop = loop
+    
+    return _async_client, _async_loop
+
+async def acreate_completion(**options):
+    """Create a chat completion with the shared AsyncOpenAI client without
+    blocking the caller's event loop
+    
+    Args:
+        **options: Arguments for chat.completions.create
+    
+    Returns:
+        ChatCompletion: The API response
+    """
+    client, loop = _get_async_client()
+    future = asyncio.run_coroutine_threadsafe(client.chat.completions.create(**options), loop)
+    # Cancelling the caller cancels the request on the client's loop too
+    return await asyncio.wrap_future(future)
+
+@atexit.register
+def close_clients():
+    """Close the shared clients and their connection pools"""
+    global _client, _async_client, _async_loop
+    
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+    
+    with _async_lock:
+        if _async_client is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(_async_client.close(), _async_loop).result(timeout=5)
+            finally:
+                _async_loop.call_soon_threadsafe(_async_loop.stop)
+            _async_client = None
+            _async_loop = None
@@ -1,15 +1,170 @@
 # app/utils/question_generator.py
+import asyncio
+import logging
 import os
-import json
-import random
-from openai import OpenAI
-from dotenv import load_dotenv
+import orjson
+from app.utils.llm_cache import LLMCache
+from app.utils.openai_client import acreate_completion, get_client
+from app.utils.semantic_cache import SemanticCache
 
-# Load environment variables
-load_dotenv()
+log = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Model that writes each type of question. QUESTION_MODEL_<TYPE>, such as
+# QUESTION_MODEL_SHORT_ANSWER=gpt-4o, moves one type to another model
+QUESTION_MODEL = "gpt-4o-mini"
+QUESTION_MODELS = {
+    question_type: os.getenv(f"QUESTION_MODEL_{question_type.upper()}", QUESTION_MODEL)
+    for question_type in ("multiple_choice", "fill_in_the_blank", "short_answer", "mixed")
+}
+
+# Instructions and response format for each question type. They are sent
+# as the system message, ahead of the content, so every request for a type
+# starts with the same prefix and OpenAI can reuse its prompt cache
+QUESTION_SYSTEM_PROMPT = """
+You are an expert educator creating educational questions based on video content.
+The questions should test deep understanding of key concepts and be valuable for learning.
+"""
+
+MULTIPLE_CHOICE_INSTRUCTIONS = """
+CREATE MULTIPLE CHOICE QUESTIONS:
+1. Focus on concepts that are central to understanding the material
+2. Provide 4 options (A, B, C, D) that are all plausible but with only one correct answer
+3. Include a brief explanation for why the correct answer is right
+
+Format your response as a JSON array of question objects with the following structure:
+{
+    "questions": [
+        {
+            "type": "multiple_choice",
+            "question_text": "The question here",
+            "options": [
+                {"id": "A", "text": "First option"},
+                {"id": "B", "text": "Second option"},
+                {"id": "C", "text": "Third option"},
+                {"id": "D", "text": "Fourth option"}
+            ],
+            "correct_answer": "A",
+            "explanation": "Why A is the correct answer"
+        }
+    ]
+}
+"""
+
+FILL_IN_BLANK_INSTRUCTIONS = """
+CREATE FILL IN THE BLANK QUESTIONS:
+1. Identify key terms or concepts from the content
+2. Create sentences with these key terms removed and replaced with a blank
+3. The blank should be for a single word or short phrase that is clearly defined in the content
+4. Include the correct answer and an explanation of why it's correct
+
+Format your response as a JSON array of question objects with the following structure:
+{
+    "questions": [
+        {
+            "type": "fill_in_the_blank",
+            "question_text": "A sentence with a _____ that needs to be filled.",
+            "correct_answer": "word",
+            "explanation": "Explanation of why this answer is correct"
+        }
+    ]
+}
+"""
+
+SHORT_ANSWER_INSTRUCTIONS = """
+CREATE SHORT ANSWER QUESTIONS:
+1. Create questions that require brief explanations (1-3 sentences)
+2. Focus on "why" and "how" questions that test understanding
+3. Include an example of a correct answer that would receive full marks
+4. Provide key points that must be included in a correct answer
+
+Format your response as a JSON array of question objects with the following structure:
+{
+    "questions": [
+        {
+            "type": "short_answer",
+            "question_text": "A question requiring a brief explanation",
+            "sample_answer": "An example of a good answer",
+            "key_points": ["Point 1 that must be mentioned", "Point 2 that must be mentioned"],
+            "explanation": "What makes a good answer to this question"
+        }
+    ]
+}
+"""
+
+MIXED_INSTRUCTIONS = """
+CREATE A MIX OF DIFFERENT QUESTION TYPES:
+Include a balanced mixture of:
+- Multiple choice questions (with 4 options)
+- Fill in the blank questions
+- Short answer questions
+
+Format your response as a JSON array of question objects with the following structures:
+{
+    "questions": [
+        {
+            "type": "multiple_choice",
+            "question_text": "A multiple choice question",
+            "options": [
+                {"id": "A", "text": "First option"},
+                {"id": "B", "text": "Second option"},
+                {"id": "C", "text": "Third option"},
+                {"id": "D", "text": "Fourth option"}
+            ],
+            "correct_answer": "A",
+            "explanation": "Why A is correct"
+        },
+        {
+            "type": "fill_in_the_blank",
+            "question_text": "A sentence with a _____ that needs to be filled.",
+            "correct_answer": "word",
+            "explanation": "Explanation of why this answer is correct"
+        },
+        {
+            "type": "short_answer",
+            "question_text": "A question requiring a brief explanation",
+            "sample_answer": "An example of a good answer",
+            "key_points": ["Point 1 that must be mentioned", "Point 2 that must be mentioned"],
+            "explanation": "What makes a good answer to this question"
+        }
+    ]
+}
+"""
+
+QUESTION_SYSTEM_PROMPTS = {
+    "multiple_choice": QUESTION_SYSTEM_PROMPT + MULTIPLE_CHOICE_INSTRUCTIONS,
+    "fill_in_the_blank": QUESTION_SYSTEM_PROMPT + FILL_IN_BLANK_INSTRUCTIONS,
+    "short_answer": QUESTION_SYSTEM_PROMPT + SHORT_ANSWER_INSTRUCTIONS,
+    "mixed": QUESTION_SYSTEM_PROMPT + MIXED_INSTRUCTIONS
+}
+
+# Questions served when the API call fails. Their metadata is added per call
+FALLBACK_QUESTIONS = (
+    {
+        "type": "multiple_choice",
+        "question_text": "What is the main concept discussed in this segment?",
+        "options": [
+            {"id": "A", "text": "Basic principles and terminology"},
+            {"id": "B", "text": "Advanced implementation details"},
+            {"id": "C", "text": "Historical context and development"},
+            {"id": "D", "text": "Comparison with alternative approaches"}
+        ],
+        "correct_answer": "A",
+        "explanation": "The segment focuses primarily on introducing basic principles and terminology."
+    },
+    {
+        "type": "fill_in_the_blank",
+        "question_text": "The main topic discussed in this segment is _____.",
+        "correct_answer": "important concept",
+        "explanation": "This segment introduces an important concept central to understanding the topic."
+    },
+    {
+        "type": "short_answer",
+        "question_text": "Explain the main concept introduced in this segment.",
+        "sample_answer": "The main concept involves understanding the fundamental principles discussed in this segment.",
+        "key_points": ["fundamental principles", "main concept"],
+        "explanation": "A good answer should identify the main concept and explain its importance."
+    }
+)
 
 class QuestionGenerator:
     def __init__(self):
@@ -20,135 +175,42 @@ class QuestionGenerator:
             "short_answer": "Short answer questions requiring a brief explanation",
             "mixed": "A mixture of different question types"
         }
+        
+        # Questions are cached by the text they were generated from, so
+        # regenerating questions for a video doesn't call the API again
+        self.cache = LLMCache(
+            "questions",
+            ttl=int(os.getenv("QUESTION_CACHE_TTL", 86400)),
+            redis_url=os.getenv("QUESTION_CACHE_REDIS_URL"),
+            cache_dir=os.getenv("QUESTION_CACHE_DIR")
+        )
+        
+        # Text that only differs in wording from an earlier chunk, such as
+        # the same lecture with other subtitles, reuses its questions. No
+        # similarity is above 1, so a higher threshold turns this off
+        threshold = float(os.getenv("QUESTION_SEMANTIC_THRESHOLD", 0.92))
+        self.semantic_cache = None
+        if threshold <= 1:
+            self.semantic_cache = SemanticCache(threshold=threshold, ttl=int(os.getenv("QUESTION_CACHE_TTL", 86400)))
     
     def _create_prompt_for_type(self, text, num_questions, question_type):
-        """Create a prompt based on the question type"""
-        base_prompt = f"""
-        You are an expert educator creating educational questions based on video content.
-        
-        Based on the following educational content, generate {num_questions} substantive questions.
-        The questions should test deep understanding of key concepts and be valuable for learning.
+        """Create the user message holding the content to ask about
         
+        The instructions for the question type are in the system message.
+        """
+        return f"""
         EDUCATIONAL CONTENT:
         {text}
-        """
         
-        if question_type == "multiple_choice":
-            return base_prompt + """
-            CREATE MULTIPLE CHOICE QUESTIONS:
-            1. Focus on concepts that are central to understanding the material
-            2. Provide 4 options (A, B, C, D) that are all plausible but with only one correct answer
-            3. Include a brief explanation for why the correct answer is right
-            
-            Format your response as a JSON array of question objects with the following structure:
-            {
-                "questions": [
-                    {
-                        "type": "multiple_choice",
-                        "question_text": "The question here",
-                        "options": [
-                            {"id": "A", "text": "First option"},
-                            {"id": "B", "text": "Second option"},
-                            {"id": "C", "text": "Third option"},
-                            {"id": "D", "text": "Fourth option"}
-                        ],
-                        "correct_answer": "A",
-                        "explanation": "Why A is the correct answer"
-                    }
-                ]
-            }
-            """
-        
-        elif question_type == "fill_in_the_blank":
-            return base_prompt + """
-            CREATE FILL IN THE BLANK QUESTIONS:
-            1. Identify key terms or concepts from the content
-            2. Create sentences with these key terms removed and replaced with a blank
-            3. The blank should be for a single word or short phrase that is clearly defined in the content
-            4. Include the correct answer and an explanation of why it's correct
-            
-            Format your response as a JSON array of question objects with the following structure:
-            {
-                "questions": [
-                    {
-                        "type": "fill_in_the_blank",
-                        "question_text": "A sentence with a _____ that needs to be filled.",
-                        "correct_answer": "word",
-                        "explanation": "Explanation of why this answer is correct"
-                    }
-                ]
-            }
-            """
-        
-        elif question_type == "short_answer":
-            return base_prompt + """
-            CREATE SHORT ANSWER QUESTIONS:
-            1. Create questions that require brief explanations (1-3 sentences)
-            2. Focus on "why" and "how" questions that test understanding
-            3. Include an example of a correct answer that would receive full marks
-            4. Provide key points that must be included in a correct answer
-            
-            Format your response as a JSON array of question objects with the following structure:
-            {
-                "questions": [
-                    {
-                        "type": "short_answer",
-                        "question_text": "A question requiring a brief explanation",
-                        "sample_answer": "An example of a good answer",
-                        "key_points": ["Point 1 that must be mentioned", "Point 2 that must be mentioned"],
-                        "explanation": "What makes a good answer to this question"
-                    }
-                ]
-            }
-            """
-        
-        elif question_type == "mixed":
-            return base_prompt + """
-            CREATE A MIX OF DIFFERENT QUESTION TYPES:
-            Include a balanced mixture of:
-            - Multiple choice questions (with 4 options)
-            - Fill in the blank questions
-            - Short answer questions
-            
-            Format your response as a JSON array of question objects with the following structures:
-            {
-                "questions": [
-                    {
-                        "type": "multiple_choice",
-                        "question_text": "A multiple choice question",
-                        "options": [
-                            {"id": "A", "text": "First option"},
-                            {"id": "B", "text": "Second option"},
-                            {"id": "C", "text": "Third option"},
-                            {"id": "D", "text": "Fourth option"}
-                        ],
-                        "correct_answer": "A",
-                        "explanation": "Why A is correct"
-                    },
-                    {
-                        "type": "fill_in_the_blank",
-                        "question_text": "A sentence with a _____ that needs to be filled.",
-                        "correct_answer": "word",
-                        "explanation": "Explanation of why this answer is correct"
-                    },
-                    {
-                        "type": "short_answer",
-                        "question_text": "A question requiring a brief explanation",
-                        "sample_answer": "An example of a good answer",
-                        "key_points": ["Point 1 that must be mentioned", "Point 2 that must be mentioned"],
-                        "explanation": "What makes a good answer to this question"
-                    }
-                ]
-            }
-            """
-        
-        else:
-            # Default to multiple choice if an invalid type is specified
-            return self._create_prompt_for_type(text, num_questions, "multiple_choice")
+        Based on this educational content, generate {num_questions} substantive questions.
+        """
     
     def generate_from_text(self, text, video_id, timestamp_start, timestamp_end, num_questions=2, question_type="multiple_choice"):
         """Generate questions based on the specified type
         
+        Questions generated before for the same or very similar text are
+        reused without an API call.
+        
         Args:
             text (str): The text content to generate questions from
             video_id (str): The ID of the video this content belongs to
@@ -161,99 +223,310 @@ class QuestionGenerator:
             list: List of generated question objects
         """
         try:
-            # Get the appropriate prompt based on question type
-            prompt = self._create_prompt_for_type(text, num_questions, question_type)
+            questions, vector = self._get_cached_questions(text, num_questions, question_type)
+            if questions is None:
+                # Get the appropriate prompt based on question type
+                prompt = self._create_prompt_for_type(text, num_questions, question_type)
+                
+                # Call OpenAI API to generate questions
+                response = get_client().chat.completions.create(**self._completion_options(prompt, question_type))
+                questions = self._parse_questions(response)
+                self._cache_questions(text, num_questions, question_type, vector, questions)
             
-            # Call OpenAI API to generate questions
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are an expert educator creating educational questions based on video content."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.7
-            )
+            return self._add_text_metadata(questions, text, video_id, timestamp_start, timestamp_end)
+        
+        except Exception as e:
+            log.error("Error generating questions: %s", e)
+            return self._add_text_metadata(self._generate_fallback_questions(question_type), text, video_id, timestamp_start, timestamp_end)
+    
+    async def agenerate_from_text(self, text, video_id, timestamp_start, timestamp_end, num_questions=2, question_type="multiple_choice"):
+        """Generate questions without blocking the event loop
+        
+        Takes the same arguments as generate_from_text. Awaiting several calls
+        together with asyncio.gather runs their API requests concurrently.
+        
+        Returns:
+            list: List of generated question objects
+        """
+        try:
+            # The cache lookup embeds the text, which is a blocking API call
+            questions, vector = await asyncio.to_thread(self._get_cached_questions, text, num_questions, question_type)
+            if questions is None:
+                prompt = self._create_prompt_for_type(text, num_questions, question_type)
+                response = await acreate_completion(**self._completion_options(prompt, question_type))
+                questions = self._parse_questions(response)
+                await asyncio.to_thread(self._cache_questions, text, num_questions, question_type, vector, questions)
             
-            # Parse the response
-            result = json.loads(response.choices[0].message.content)
-            questions = result.get("questions", [])
+            return self._add_text_metadata(questions, text, video_id, timestamp_start, timestamp_end)
+        
+        except Exception as e:
+            log.error("Error generating questions: %s", e)
+            return self._add_text_metadata(self._generate_fallback_questions(question_type), text, video_id, timestamp_start, timestamp_end)
+    
+    def generate_batch(self, chunks, question_type, video_id, num_per_chunk=1):
+        """Generate questions for every chunk with a single API request
+        
+        Chunks whose questions are cached are left out of the request.
+        
+        Args:
+            chunks (list): Topic chunks with text, start_time and end_time
+            question_type (str): Type of questions to generate
+            video_id (str): The ID of the video the chunks belong to
+            num_per_chunk (int): Number of questions to generate for each chunk
             
-            # Add metadata to each question
-            for i, question in enumerate(questions):
-                question["question_id"] = f"{video_id}_{timestamp_start}_{i}"
-                question["video_id"] = video_id
-                question["timestamp_start"] = timestamp_start
-                question["timestamp_end"] = timestamp_end
-                
-                # Ensure each question has a type field
-                if "type" not in question:
-                    if "options" in question:
-                        question["type"] = "multiple_choice"
-                    elif "___" in question.get("question_text", ""):
-                        question["type"] = "fill_in_the_blank"
-                    else:
-                        question["type"] = "short_answer"
+        Returns:
+            list: Generated question objects in chunk order
+        """
+        if not chunks:
+            return []
+        
+        chunk_questions, vectors = self._get_cached_chunk_questions(chunks, question_type, num_per_chunk)
+        missing = self._missing_chunks(chunks, chunk_questions)
+        
+        if missing:
+            # Chunks with the same text, like a repeated intro, are asked about once
+            missing_chunks = [chunks[indices[0]] for indices in missing]
+            try:
+                prompt = self._create_batch_prompt(missing_chunks, question_type, num_per_chunk)
+                response = get_client().chat.completions.create(**self._completion_options(prompt, question_type))
+                generated = self._parse_batch(response, len(missing_chunks))
+                self._cache_chunk_questions(missing_chunks, question_type, num_per_chunk, [vectors[indices[0]] for indices in missing], generated)
+            
+            except Exception as e:
+                log.error("Error generating questions: %s", e)
+                generated = self._generate_batch_fallback_questions(missing_chunks, question_type)
             
-            return questions
+            for indices, questions in zip(missing, generated):
+                for i in indices:
+                    # Every occurrence gets its own copies to add its metadata to
+                    chunk_questions[i] = [dict(question) for question in questions]
         
-        except Exception as e:
-            print(f"Error generating questions: {str(e)}")
-            return self._generate_fallback_questions(video_id, timestamp_start, timestamp_end, question_type)
+        return self._add_chunk_metadata(chunks, chunk_questions, video_id)
     
-    def _generate_fallback_questions(self, video_id, timestamp_start, timestamp_end, question_type):
-        """Generate fallback questions if the API call fails"""
-        fallback_questions = []
-        
-        if question_type in ["multiple_choice", "mixed"]:
-            fallback_questions.append({
-                "type": "multiple_choice",
-                "question_id": f"{video_id}_{timestamp_start}_0",
-                "video_id": video_id,
-                "timestamp_start": timestamp_start,
-                "timestamp_end": timestamp_end,
-                "question_text": "What is the main concept discussed in this segment?",
-                "options": [
-                    {"id": "A", "text": "Basic principles and terminology"},
-                    {"id": "B", "text": "Advanced implementation details"},
-                    {"id": "C", "text": "Historical context and development"},
-                    {"id": "D", "text": "Comparison with alternative approaches"}
-                ],
-                "correct_answer": "A",
-                "explanation": "The segment focuses primarily on introducing basic principles and terminology."
-            })
-        
-        if question_type in ["fill_in_the_blank", "mixed"]:
-            fallback_questions.append({
-                "type": "fill_in_the_blank",
-                "question_id": f"{video_id}_{timestamp_start}_1",
-                "video_id": video_id,
-                "timestamp_start": timestamp_start,
-                "timestamp_end": timestamp_end,
-                "question_text": "The main topic discussed in this segment is _____.",
-                "correct_answer": "important concept",
-                "explanation": "This segment introduces an important concept central to understanding the topic."
-            })
-        
-        if question_type in ["short_answer", "mixed"]:
-            fallback_questions.append({
-                "type": "short_answer",
-                "question_id": f"{video_id}_{timestamp_start}_2",
-                "video_id": video_id,
-                "timestamp_start": timestamp_start,
-                "timestamp_end": timestamp_end,
-                "question_text": "Explain the main concept introduced in this segment.",
-                "sample_answer": "The main concept involves understanding the fundamental principles discussed in this segment.",
-                "key_points": ["fundamental principles", "main concept"],
-                "explanation": "A good answer should identify the main concept and explain its importance."
-            })
-        
-        # Return a subset of the fallback questions based on the requested type
-        if question_type == "multiple_choice":
-            return fallback_questions[:1]
-        elif question_type == "fill_in_the_blank":
-            return fallback_questions[1:2]
-        elif question_type == "short_answer":
-            return fallback_questions[2:3]
-        else:
-            return fallback_questions
\ No newline at end of file
+    async def agenerate_batch(self, chunks, question_type, video_id, num_per_chunk=1):
+        """Generate questions for every chunk with a single non-blocking API request
+        
+        Takes the same arguments and returns the same result as generate_batch.
+        """
+        if not chunks:
+            return []
+        
+        chunk_questions, vectors = await asyncio.to_thread(self._get_cached_chunk_questions, chunks, question_type, num_per_chunk)
+        missing = self._missing_chunks(chunks, chunk_questions)
+        
+        if missing:
+            # Chunks with the same text, like a repeated intro, are asked about once
+            missing_chunks = [chunks[indices[0]] for indices in missing]
+            try:
+                prompt = self._create_batch_prompt(missing_chunks, question_type, num_per_chunk)
+                response = await acreate_completion(**self._completion_options(prompt, question_type))
+                generated = self._parse_batch(response, len(missing_chunks))
+                await asyncio.to_thread(self._cache_chunk_questions, missing_chunks, question_type, num_per_chunk, [vectors[indices[0]] for indices in missing], generated)
+            
+            except Exception as e:
+                log.error("Error generating questions: %s", e)
+                generated = self._generate_batch_fallback_questions(missing_chunks, question_type)
+            
+            for indices, questions in zip(missing, generated):
+                for i in indices:
+                    # Every occurrence gets its own copies to add its metadata to
+                    chunk_questions[i] = [dict(question) for question in questions]
+        
+        return self._add_chunk_metadata(chunks, chunk_questions, video_id)
+    
+    def _cache_key(self, text, num_questions, question_type):
+        """Key generated questions by what they were generated from"""
+        return self.cache.make_key(text=text, n=num_questions, type=question_type)
+    
+    def _get_cached_questions(self, text, num_questions, question_type):
+        """Get the questions cached for the same or the most similar text
+        
+        Returns:
+            tuple: Copies of the cached questions, or None on a miss, and the
+                text's embedding for storing new questions, or None
+        """
+        cached = self.cache.get(self._cache_key(text, num_questions, question_type))
+        if cached is not None:
+            return [dict(question) for question in cached["questions"]], None
+        
+        vector = self.semantic_cache.embed(text) if self.semantic_cache is not None else None
+        if vector is not None:
+            cached = self.semantic_cache.get((question_type, num_questions), vector)
+            if cached is not None:
+                return [dict(question) for question in cached["questions"]], vector
+        
+        return None, vector
+    
+    def _get_cached_chunk_questions(self, chunks, question_type, num_per_chunk):
+        """Get the cached question of each chunk, embedding the missed chunks
+        with a single API call
+        
+        Returns:
+            tuple: A list with each chunk's cached questions or None, and a
+                list with each missed chunk's embedding or None
+        """
+        chunk_questions = []
+        for chunk in chunks:
+            cached = self.cache.get(self._cache_key(chunk.get("text"), num_per_chunk, question_type))
+            chunk_questions.append([dict(question) for question in cached["questions"]] if cached is not None else None)
+        
+        vectors = [None] * len(chunks)
+        missing = [i for i, questions in enumerate(chunk_questions) if questions is None]
+        
+        if missing and self.semantic_cache is not None:
+            embedded = self.semantic_cache.embed_many([chunks[i].get("text") for i in missing])
+            for i, vector in zip(missing, embedded):
+                vectors[i] = vector
+                cached = self.semantic_cache.get((question_type, num_per_chunk), vector) if vector is not None else None
+                if cached is not None:
+                    chunk_questions[i] = [dict(question) for question in cached["questions"]]
+        
+        return chunk_questions, vectors
+    
+    def _missing_chunks(self, chunks, chunk_questions):
+        """Group the indices of the chunks without cached questions by their text
+        
+        Returns:
+            list: One list of chunk indices for each distinct text, in order
+        """
+        missing = {}
+        for i, questions in enumerate(chunk_questions):
+            if questions is None:
+                missing.setdefault(chunks[i].get("text"), []).append(i)
+        
+        return list(missing.values())
+    
+    def _cache_questions(self, text, num_questions, question_type, vector, questions):
+        """Cache questions generated from a text"""
+        if not questions:
+            return
+        
+        # Copies are stored, since the returned questions get their metadata
+        value = {"questions": [dict(question) for question in questions]}
+        self.cache.set(self._cache_key(text, num_questions, question_type), value)
+        if vector is not None:
+            self.semantic_cache.set((question_type, num_questions), vector, value)
+    
+    def _cache_chunk_questions(self, chunks, question_type, num_per_chunk, vectors, chunk_questions):
+        """Cache the questions generated for each chunk of a batch"""
+        for chunk, vector, questions in zip(chunks, vectors, chunk_questions):
+            self._cache_questions(chunk.get("text"), num_per_chunk, question_type, vector, questions)
+    
+    def _create_batch_prompt(self, chunks, question_type, num_per_chunk):
+        """Create a prompt asking for questions about each numbered chunk"""
+        text = "\n".join(
+            f'<chunk index="{i}" start="{chunk.get("start_time")}" end="{chunk.get("end_time")}">{chunk.get("text")}</chunk>'
+            for i, chunk in enumerate(chunks)
+        )
+        
+        return self._create_prompt_for_type(text, len(chunks) * num_per_chunk, question_type) + f"""
+        The content is split into numbered <chunk> blocks. Write exactly {num_per_chunk} question(s) for
+        each chunk, based only on that chunk, and add a "chunk_index" field to every question object
+        with the index of the chunk it is about.
+        """
+    
+    def _completion_options(self, prompt, question_type):
+        """Build the chat completion arguments for a question generation prompt"""
+        # Default to multiple choice if an invalid type is specified
+        system_prompt = QUESTION_SYSTEM_PROMPTS.get(question_type, QUESTION_SYSTEM_PROMPTS["multiple_choice"])
+        
+        return {
+            "model": QUESTION_MODELS.get(question_type, QUESTION_MODEL),
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            "response_format": {"type": "json_object"},
+            "temperature": 0.7
+        }
+    
+    def _parse_questions(self, response):
+        """Parse the questions from an API response"""
+        result = orjson.loads(response.choices[0].message.content)
+        return result.get("questions", [])
+    
+    def _parse_batch(self, response, num_chunks):
+        """Parse the questions from a batch response
+        
+        Returns:
+            list: The questions generated for each chunk, in chunk order
+        """
+        result = orjson.loads(response.choices[0].message.content)
+        chunk_questions = [[] for _ in range(num_chunks)]
+        
+        # Models sometimes write the index as a string or a float. Drop
+        # anything that does not point at one of the requested chunks
+        for question in result.get("questions", []):
+            if not isinstance(question, dict):
+                continue
+            try:
+                chunk_index = int(question.pop("chunk_index", None))
+            except (TypeError, ValueError):
+                continue
+            if 0 <= chunk_index < num_chunks:
+                chunk_questions[chunk_index].append(question)
+        
+        return chunk_questions
+    
+    def _add_text_metadata(self, questions, text, video_id, timestamp_start, timestamp_end):
+        """Add the metadata of the text they were generated from to questions"""
+        for question in questions:
+            self._add_metadata(question, video_id, timestamp_start, timestamp_end, text)
+        
+        return questions
+    
+    def _add_chunk_metadata(self, chunks, chunk_questions, video_id):
+        """Add each chunk's metadata to its questions and flatten them in chunk order"""
+        questions = []
+        for chunk, generated in zip(chunks, chunk_questions):
+            for question in generated:
+                self._add_metadata(question, video_id, chunk.get("start_time"), chunk.get("end_time"), chunk.get("text"))
+                questions.append(question)
+        
+        return questions
+    
+    def _add_metadata(self, question, video_id, timestamp_start, timestamp_end, context_text):
+        """Add the video, timestamp and source text metadata to a generated question
+        
+        Its ID is assigned when it is saved to the database
+        """
+        question |= {
+            "video_id": video_id,
+            "timestamp_start": timestamp_start,
+            "timestamp_end": timestamp_end,
+            "context_text": context_text
+        }
+        
+        # Ensure each question has a type field
+        if "type" not in question:
+            question["type"] = self._infer_type(question)
+    
+    def _infer_type(self, question):
+        """Infer the type of a question from the fields it was generated with"""
+        if "options" in question:
+            return "multiple_choice"
+        if "key_points" in question:
+            return "short_answer"
+        if "___" in question.get("question_text", ""):
+            return "fill_in_the_blank"
+        return "short_answer"
+    
+    def _generate_batch_fallback_questions(self, chunks, question_type):
+        """Generate fallback questions for every chunk of a failed batch request
+        
+        Returns:
+            list: The fallback questions for each chunk, in chunk order
+        """
+        return [self._generate_fallback_questions(question_type) for _ in chunks]
+    
+    def _generate_fallback_questions(self, question_type):
+        """Generate fallback questions if the API call fails
+        
+        Their metadata is added by the caller, like that of generated questions
+        """
+        # Every type gets its own template, and mixed gets all of them
+        return [
+            dict(template)
+            for template in FALLBACK_QUESTIONS
+            if question_type in (template["type"], "mixed")
+        ]
@@ -0,0 +1,171 @@
+# app/utils/semantic_cache.py
+import logging
+import os
+import threading
+import numpy as np
+from cachetools import LRUCache, TTLCache
+from app.utils.openai_client import get_client
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+except ImportError:
+    onnxruntime = None
+
+log = logging.getLogger(__name__)
+
+class LocalEmbedder:
+    """Sentence embeddings computed on the CPU with an ONNX export of a
+    model such as all-MiniLM-L6-v2, without an API round trip
+    """
+    
+    def __init__(self, model_path, tokenizer_path, max_length=256):
+        """Load a model
+        
+        Args:
+            model_path (str): ONNX model file
+            tokenizer_path (str): tokenizer.json file of the same model
+            max_length (int): Most tokens embedded per text
+        """
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = os.cpu_count()
+        self._session = onnxruntime.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = {model_input.name for model_input in self._session.get_inputs()}
+        
+        self._tokenizer = Tokenizer.from_file(tokenizer_path)
+        self._tokenizer.enable_truncation(max_length)
+        self._tokenizer.enable_padding()
+    
+    def embed(self, texts):
+        """Get the unit-length embeddings of several texts as the rows of a matrix"""
+        encodings = self._tokenizer.encode_batch(texts)
+        ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        
+        inputs = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self._input_names:
+            inputs["token_type_ids"] = np.zeros_like(ids)
+        
+        # Average the token embeddings, leaving out the padding
+        tokens = self._session.run(None, inputs)[0]
+        weights = mask[:, :, np.newaxis].astype(np.float32)
+        vectors = (tokens * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        
+        return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+class SemanticCache:
+    """Cache that returns the result stored for the most similar earlier text
+    
+    Texts are compared by the cosine similarity of their OpenAI embeddings,
+    or of local ONNX embeddings when SEMANTIC_CACHE_ONNX_MODEL and
+    SEMANTIC_CACHE_ONNX_TOKENIZER are set. Entries are grouped into scopes,
+    such as one per question, and a lookup only searches its own scope, so
+    results never leak between them.
+    """
+    
+    def __init__(self, threshold=0.93, model="text-embedding-3-small", max_scopes=1024,
+                 max_entries_per_scope=256, ttl=86400):
+        """Create a cache
+        
+        Args:
+            threshold (float): Lowest cosine similarity that counts as a hit
+            model (str): OpenAI embedding model
+            max_scopes (int): Most scopes kept at once
+            max_entries_per_scope (int): Most entries kept in a scope; the
+                oldest are dropped first
+            ttl (int): Seconds a scope is kept after it was created
+        """
+        self.threshold = threshold
+        self.model = model
+        self.max_entries_per_scope = max_entries_per_scope
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        # Each scope holds a matrix of unit vectors, one row per entry, and
+        # the matching values
+        self._scopes = TTLCache(maxsize=max_scopes, ttl=ttl)
+        # A text is often embedded for a lookup and again to store its result
+        self._embeddings = LRUCache(maxsize=1024)
+        
+        # The local model is loaded on first use
+        self._local_paths = (os.getenv("SEMANTIC_CACHE_ONNX_MODEL"), os.getenv("SEMANTIC_CACHE_ONNX_TOKENIZER"))
+        self._local = None
+        if all(self._local_paths) and onnxruntime is None:
+            log.warning("onnxruntime or tokenizers not installed, embedding with the OpenAI API. Install with: pip install onnxruntime tokenizers")
+            self._local_paths = (None, None)
+    
+    def embed(self, text):
+        """Get the unit-length embedding of a text, or None if embedding fails"""
+        return self.embed_many([text])[0]
+    
+    def embed_many(self, texts):
+        """Get the unit-length embeddings of several texts with at most one API
+        call, or None for each text if embedding fails
+        """
+        with self._lock:
+            vectors = {text: self._embeddings.get(text) for text in texts}
+        
+        missing = [text for text, vector in vectors.items() if vector is None]
+        if missing:
+            try:
+                embedded = self._embed_texts(missing)
+            except Exception as e:
+                log.error("Error embedding texts for semantic cache: %s", e)
+                return [None] * len(texts)
+            
+            with self._lock:
+                for text, vector in zip(missing, embedded):
+                    vectors[text] = vector
+                    self._embeddings[text] = vector
+        
+        return [vectors[text] for text in texts]
+    
+    def _embed_texts(self, texts):
+        """Embed texts with the local model if one is configured, or else
+        with one OpenAI API call
+        """
+        if all(self._local_paths):
+            with self._lock:
+                if self._local is None:
+                    self._local = LocalEmbedder(*self._local_paths)
+            return list(self._local.embed(texts))
+        
+        response = get_client().embeddings.create(model=self.model, input=texts)
+        vectors = []
+        for item in response.data:
+            vector = np.asarray(item.embedding, dtype=np.float32)
+            vectors.append(vector / np.linalg.norm(vector))
+        return vectors
+    
+    def get(self, scope, vector):
+        """Get the value stored for the most similar entry in a scope, or None
+        if no entry is similar enough
+        """
+        with self._lock:
+            entry = self._scopes.get(scope)
+            value = None
+            
+            if entry is not None:
+                similarities = entry["vectors"] @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    value = dict(entry["values"][best])
+            
+            self.stats["hits" if value is not None else "misses"] += 1
+        
+        return value
+    
+    def set(self, scope, vector, value):
+        """Store a value for an embedded text in a scope"""
+        with self._lock:
+            entry = self._scopes.get(scope)
+            
+            if entry is None:
+                entry = {"vectors": vector[np.newaxis, :], "values": [dict(value)]}
+            else:
+                keep = self.max_entries_per_scope - 1
+                entry = {
+                    "vectors": np.vstack([entry["vectors"][-keep:], vector]),
+                    "values": entry["values"][-keep:] + [dict(value)]
+                }
+            
+            self._scopes[scope] = entry
@@ -1,11 +1,32 @@
 # app/utils/subtitle_parser.py
-import pysrt
+import bisect
+import itertools
+import logging
+import operator
+import os
+import re
+import numpy as np
 import webvtt
-from pathlib import Path
+
+# SRT cue timings look like 00:01:02,500 --> 00:01:05,000, optionally
+# followed by position coordinates. As with pysrt, hours may be a single
+# digit, the milliseconds may follow a dot and have fewer than 3 digits
+SRT_TIMING_PATTERN = re.compile(r'^\s*(\d+):([0-5]\d):([0-5]\d)[,.](\d{1,3})\s*-->\s*(\d+):([0-5]\d):([0-5]\d)[,.](\d{1,3})(?:\s|$)')
+
+# VTT timestamps are HH:MM:SS.mmm, or MM:SS.mmm without hours
+VTT_TIMESTAMP_PATTERN = re.compile(r'(?:(\d+):)?(\d+):(\d+(?:\.\d+)?)')
+
+# Seconds in each hours, minutes and seconds field, for converting all the
+# parsed timestamps with one matrix product
+TIMESTAMP_FIELD_SECONDS = np.array([3600.0, 60.0, 1.0])
+
+log = logging.getLogger(__name__)
 
 class SubtitleParser:
     def __init__(self):
-        self.supported_formats = ['srt', 'vtt']
+        # Parser for each supported file extension
+        self._parsers = {'srt': self._iter_srt, 'vtt': self._parse_vtt}
+        self.supported_formats = list(self._parsers)
     
     def parse(self, file_path):
         """Parse subtitle file and return structured data
@@ -16,55 +37,117 @@ class SubtitleParser:
         Returns:
             list: List of subtitle segments with text and timestamps
         """
-        file_path = Path(file_path)
-        file_extension = file_path.suffix.lower()[1:]
+        return list(self.iter_parse(file_path))
+    
+    def iter_parse(self, file_path):
+        """Parse subtitle file one segment at a time
+        
+        SRT files are read as they are parsed, so only the current cue is
+        held in memory.
         
-        if file_extension not in self.supported_formats:
+        Args:
+            file_path (str): Path to the subtitle file
+            
+        Returns:
+            iterator: Subtitle segments with text and timestamps
+        """
+        file_extension = os.path.splitext(file_path)[1][1:].lower()
+        parser = self._parsers.get(file_extension)
+        
+        if parser is None:
             raise ValueError(f"Unsupported subtitle format: {file_extension}")
         
-        if file_extension == 'srt':
-            return self._parse_srt(file_path)
-        elif file_extension == 'vtt':
-            return self._parse_vtt(file_path)
+        return iter(parser(file_path))
     
-    def _parse_srt(self, file_path):
-        """Parse SRT subtitle file"""
-        subs = pysrt.open(file_path)
-        segments = []
+    def _iter_srt(self, file_path):
+        """Parse SRT subtitle file, yielding each cue as it is read
         
-        for sub in subs:
-            segment = {
-                'index': sub.index,
-                'text': sub.text,
-                'start_time': sub.start.hours * 3600 + sub.start.minutes * 60 + sub.start.seconds + sub.start.milliseconds / 1000,
-                'end_time': sub.end.hours * 3600 + sub.end.minutes * 60 + sub.end.seconds + sub.end.milliseconds / 1000,
-                'start_time_str': str(sub.start),
-                'end_time_str': str(sub.end)
-            }
-            segments.append(segment)
+        Cues with a malformed timing line, or that end before they start,
+        are skipped. A file that isn't UTF-8 raises UnicodeDecodeError, and
+        one with text but no valid cue raises ValueError.
+        """
+        with open(file_path, 'r', encoding='utf-8-sig', buffering=1 << 16) as file:
+            count = 0
+            index = None
+            timing = None
+            malformed = False
+            has_text = False
+            lines = []
+            
+            # A cue is an optional index line, a timing line and its text
+            # lines, and cues are separated by blank lines
+            for line in itertools.chain(file, ['']):
+                line = line.rstrip('\r\n')
+                has_text = has_text or bool(line.strip())
+                
+                if not line.strip():
+                    if timing is not None:
+                        segment = self._srt_segment(index if index is not None else count + 1, timing, lines)
+                        if segment['end_time'] >= segment['start_time']:
+                            count += 1
+                            yield segment
+                        else:
+                            log.warning("Skipping SRT cue %s of %s, which ends before it starts", segment['index'], file_path)
+                    index = None
+                    timing = None
+                    malformed = False
+                    lines = []
+                elif timing is not None:
+                    lines.append(line)
+                elif malformed:
+                    # The text of a skipped cue is dropped with it
+                    continue
+                else:
+                    match = SRT_TIMING_PATTERN.match(line)
+                    if match:
+                        timing = match.groups()
+                    elif '-->' in line:
+                        malformed = True
+                        log.warning("Skipping SRT cue with malformed timing %r in %s", line, file_path)
+                    elif line.strip().isdigit():
+                        index = int(line)
+            
+            if has_text and not count:
+                raise ValueError(f"No valid subtitle cues in {file_path}")
+    
+    def _srt_segment(self, index, timing, lines):
+        """Build a segment from the index, timing fields and text lines of an SRT cue"""
+        # Milliseconds written with fewer digits are a fraction of a second,
+        # so 3,5 is 3.5 seconds
+        start = [int(part) for part in timing[:3]] + [int(timing[3].ljust(3, '0'))]
+        end = [int(part) for part in timing[4:7]] + [int(timing[7].ljust(3, '0'))]
         
-        return segments
+        # Summed in whole milliseconds so the times are exact to the millisecond
+        return {
+            'index': index,
+            'text': '\n'.join(lines),
+            'start_time': (((start[0] * 60 + start[1]) * 60 + start[2]) * 1000 + start[3]) / 1000,
+            'end_time': (((end[0] * 60 + end[1]) * 60 + end[2]) * 1000 + end[3]) / 1000,
+            'start_time_str': '%02d:%02d:%02d,%03d' % tuple(start),
+            'end_time_str': '%02d:%02d:%02d,%03d' % tuple(end)
+        }
     
     def _parse_vtt(self, file_path):
         """Parse VTT subtitle file"""
+        captions = webvtt.read(file_path)
+        if not captions:
+            return []
+        
+        # Convert every start and end time to seconds in one matrix product
+        parts = np.array([
+            VTT_TIMESTAMP_PATTERN.match(timestamp).groups(default='0')
+            for caption in captions
+            for timestamp in (caption.start, caption.end)
+        ], dtype=np.float64)
+        times = (parts @ TIMESTAMP_FIELD_SECONDS).tolist()
+        
         segments = []
-        for i, caption in enumerate(webvtt.read(file_path)):
-            # Parse the timestamp strings to seconds
-            start_parts = caption.start.split(':')
-            end_parts = caption.end.split(':')
-            
-            if len(start_parts) == 3:  # HH:MM:SS.mmm format
-                start_time = float(start_parts[0]) * 3600 + float(start_parts[1]) * 60 + float(start_parts[2])
-                end_time = float(end_parts[0]) * 3600 + float(end_parts[1]) * 60 + float(end_parts[2])
-            else:  # MM:SS.mmm format
-                start_time = float(start_parts[0]) * 60 + float(start_parts[1])
-                end_time = float(end_parts[0]) * 60 + float(end_parts[1])
-            
+        for i, caption in enumerate(captions):
             segment = {
                 'index': i + 1,
                 'text': caption.text,
-                'start_time': start_time,
-                'end_time': end_time,
+                'start_time': times[2 * i],
+                'end_time': times[2 * i + 1],
                 'start_time_str': caption.start,
                 'end_time_str': caption.end
             }
@@ -76,26 +159,68 @@ class SubtitleParser:
         """Group subtitle segments into potential topic chunks
         
         Args:
-            segments (list): List of subtitle segments
+            segments (iterable): Subtitle segments, such as from iter_parse
             window_size (int): Number of segments to group together
             
         Returns:
             list: List of grouped segments
         """
         groups = []
+        segments = iter(segments)
+        get_text = operator.itemgetter('text')
         
-        for i in range(0, len(segments), window_size):
-            chunk = segments[i:i + window_size]
+        # Take window_size segments at a time until the iterable runs out
+        for chunk in iter(lambda: list(itertools.islice(segments, window_size)), []):
+            group = {
+                'start_index': chunk[0]['index'],
+                'end_index': chunk[-1]['index'],
+                'start_time': chunk[0]['start_time'],
+                'end_time': chunk[-1]['end_time'],
+                'text': ' '.join(map(get_text, chunk)),
+                'segments': chunk
+            }
+            groups.append(group)
+        
+        return groups
+    
+    def build_index(self, segments):
+        """Build a sorted, column-oriented index over subtitle segments
+        
+        Args:
+            segments (list): List of subtitle segments
             
-            if len(chunk) > 0:
-                group = {
-                    'start_index': chunk[0]['index'],
-                    'end_index': chunk[-1]['index'],
-                    'start_time': chunk[0]['start_time'],
-                    'end_time': chunk[-1]['end_time'],
-                    'text': ' '.join([segment['text'] for segment in chunk]),
-                    'segments': chunk
-                }
-                groups.append(group)
-        
-        return groups
\ No newline at end of file
+        Returns:
+            dict: Parallel lists of start times, end times, running maximum
+                end times and texts, all ordered by start time
+        """
+        ordered = sorted(segments, key=lambda segment: float(segment.get('start_time', 0)))
+        ends = [float(segment.get('end_time', 0)) for segment in ordered]
+        
+        return {
+            'starts': [float(segment.get('start_time', 0)) for segment in ordered],
+            'ends': ends,
+            'max_ends': list(itertools.accumulate(ends, max)),
+            'texts': [segment.get('text', '') for segment in ordered]
+        }
+    
+    def find_text_near(self, index, timestamp, window=30):
+        """Find the text of segments within a time window around a timestamp
+        
+        Args:
+            index (dict): Segment index created by build_index
+            timestamp (float): Timestamp in seconds
+            window (float): Number of seconds before and after the timestamp
+            
+        Returns:
+            list: Texts of the matching segments in chronological order
+        """
+        # A segment matches when it starts before the end of the window and
+        # ends after its beginning. The running maximum of end times is
+        # sorted, so both bounds can be located with a binary search.
+        window_start = timestamp - window
+        lo = bisect.bisect_right(index['max_ends'], window_start)
+        hi = bisect.bisect_left(index['starts'], timestamp + window)
+        
+        ends = index['ends']
+        texts = index['texts']
+        return [texts[i] for i in range(lo, hi) if ends[i] > window_start]
\ No newline at end of file
@@ -0,0 +1,32 @@
+# conftest.py
+from types import SimpleNamespace
+import pytest
+from app.utils import feedback_generator, openai_client, question_generator
+
+class FakeCompletions:
+    """Chat completions endpoint that answers with queued JSON contents"""
+    
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+    
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        content = self.responses.pop(0) if self.responses else "{}"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+    
+    async def acreate(self, **kwargs):
+        return self.create(**kwargs)
+
+@pytest.fixture
+def completions(monkeypatch):
+    """Replace the shared OpenAI clients so no test calls the API"""
+    fake = FakeCompletions()
+    monkeypatch.setattr(openai_client, "_client", SimpleNamespace(chat=SimpleNamespace(completions=fake)))
+    for module in (feedback_generator, question_generator):
+        monkeypatch.setattr(module, "acreate_completion", fake.acreate)
+    
+    # Semantic caches would embed every text with the API
+    monkeypatch.setenv("FEEDBACK_SEMANTIC_THRESHOLD", "2")
+    monkeypatch.setenv("QUESTION_SEMANTIC_THRESHOLD", "2")
+    return fake
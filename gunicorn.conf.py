@@ -0,0 +1,21 @@
+# gunicorn.conf.py
+# Production server settings, used with: gunicorn app.app:app
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Requests mostly wait on OpenAI and YouTube, so each worker serves them
+# from a pool of threads
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+# The JSON database only serializes writes within a process, so a single
+# worker is the safe default. Set WEB_CONCURRENCY to run more with the
+# SQLite backend
+workers = int(os.getenv('WEB_CONCURRENCY', 1))
+
+# Keep connections from the frontend and proxies open between requests
+keepalive = 75
+
+# Question generation can take 10-30 seconds
+timeout = 120
@@ -0,0 +1,111 @@
+# test_app.py
+import orjson
+import pytest
+from app.models.database import Database
+from app.utils.feedback_generator import FeedbackGenerator
+from app.utils.question_generator import QuestionGenerator
+
+QUESTION = {
+    'video_id': 'test_video_id',
+    'type': 'fill_in_the_blank',
+    'question_text': 'Supervised learning is trained on _____ data.',
+    'correct_answer': 'labeled',
+    'explanation': 'Supervised models learn from labeled examples.'
+}
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch, completions):
+    """The app with its own database in tmp_path and empty caches"""
+    from app import app as app_module
+    
+    monkeypatch.setattr(app_module, 'db', Database(tmp_path))
+    monkeypatch.setattr(app_module, 'feedback_generator', FeedbackGenerator())
+    monkeypatch.setattr(app_module, 'question_generator', QuestionGenerator())
+    return app_module
+
+def write_srt(path, count):
+    """Write an SRT file with count one-second cues"""
+    path.write_text("".join(
+        f"{i + 1}\n00:00:{i:02d},000 --> 00:00:{i:02d},900\nSentence number {i}.\n\n" for i in range(count)
+    ), encoding="utf-8")
+    return str(path)
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+@pytest.fixture
+def question_id(app_module):
+    return app_module.db.add_questions([dict(QUESTION)])[0]
+
+def test_verify_answer(client, question_id):
+    response = client.post(f'/api/questions/{question_id}/verify', json={'answer': 'Labeled'})
+    
+    assert response.status_code == 200
+    assert response.json['is_correct'] is True
+
+@pytest.mark.parametrize('body', [{}, {'answer': 3}, {'answer': ['labeled']}, ['labeled']])
+def test_verify_answer_rejects_non_string_answers(client, question_id, body):
+    response = client.post(f'/api/questions/{question_id}/verify', json=body)
+    
+    assert response.status_code == 400
+
+def test_verify_answers(client, question_id):
+    response = client.post('/api/questions/verify', json={'answers': [
+        {'question_id': question_id, 'answer': 'labeled'},
+        {'question_id': question_id},
+        {'question_id': 999, 'answer': 'labeled'}
+    ]})
+    
+    assert response.status_code == 200
+    assert response.json[0]['is_correct'] is True
+    assert response.json[1:] == [{'error': 'No answer provided'}, {'error': 'Question not found'}]
+
+@pytest.mark.parametrize('body', [
+    ['labeled'],
+    {'answers': ['labeled']},
+    {'answers': [{'question_id': 1, 'answer': 3}]},
+    {'answers': [{'question_id': [1], 'answer': 'labeled'}]},
+    {'answers': [{'question_id': True, 'answer': 'labeled'}]},
+    {'answers': [{'answer': 'labeled'}]}
+])
+def test_verify_answers_rejects_malformed_items(client, question_id, body):
+    response = client.post('/api/questions/verify', json=body)
+    
+    assert response.status_code == 400
+
+def test_add_video_returns_a_summary(client, tmp_path):
+    response = client.post('/api/videos', json={'title': 'Lecture', 'file_path': 'lecture.mp4', 'subtitle_path': write_srt(tmp_path / 'lecture.srt', 3)})
+    video_id = response.json['video_id']
+    
+    assert response.status_code == 201
+    assert response.json['subtitle_segments_count'] == 3
+    for video in (response.json, client.get('/api/videos').json[0], client.get(f'/api/videos/{video_id}').json):
+        assert 'subtitle_segments' not in video and 'topic_chunks' not in video
+    assert len(client.get(f'/api/videos/{video_id}/subtitles').json) == 3
+
+def test_add_video_rejects_subtitles_without_cues(client, tmp_path):
+    (tmp_path / 'broken.srt').write_text("1\n00:00:01 --> 00:00:02\nNo milliseconds.\n", encoding="utf-8")
+    
+    response = client.post('/api/videos', json={'title': 'Lecture', 'file_path': 'lecture.mp4', 'subtitle_path': str(tmp_path / 'broken.srt')})
+    
+    assert response.status_code == 400
+    assert client.get('/api/videos').json == []
+
+def test_generate_questions_from_fewer_chunks_than_questions(client, completions, tmp_path):
+    video_id = client.post('/api/videos', json={'title': 'Lecture', 'file_path': 'lecture.mp4', 'subtitle_path': write_srt(tmp_path / 'lecture.srt', 25)}).json['video_id']
+    completions.responses.append(orjson.dumps({'questions': [
+        {**QUESTION, 'question_text': f'Question {i} about chunk {i // 2}', 'chunk_index': i // 2} for i in range(10)
+    ]}).decode())
+    
+    response = client.post(f'/api/videos/{video_id}/generate-questions', json={'question_type': 'fill_in_the_blank', 'question_count': 10})
+    
+    texts = [question['question_text'] for question in response.json['questions']]
+    assert response.status_code == 200
+    # Each of the 5 chunks is asked for 2 questions in one request
+    assert len(completions.requests) == 1
+    assert 'exactly 2 question(s)' in completions.requests[0]['messages'][-1]['content']
+    assert len(texts) == len(set(texts)) == 10
+    assert len(client.get(f'/api/videos/{video_id}/questions').json) == 10
+    assert client.get('/api/videos').json[0]['questions_count'] == 10
+    assert client.get(f'/api/videos/{video_id}').json['questions_count'] == 10
@@ -0,0 +1,131 @@
+# test_database.py
+import sqlite3
+import pytest
+from app.models import database
+from app.models.database import Database
+from app.models.sqlite_database import SQLiteDatabase
+
+@pytest.fixture(params=[Database, SQLiteDatabase])
+def db(request, tmp_path):
+    return request.param(tmp_path)
+
+def question(video_id, text):
+    return {'video_id': video_id, 'type': 'short_answer', 'question_text': text}
+
+def test_first_run_creates_empty_files(tmp_path):
+    db = Database(tmp_path)
+    
+    assert (tmp_path / 'videos.jsonl').read_bytes() == b''
+    assert (tmp_path / 'questions.jsonl').read_bytes() == b''
+    assert db.get_all_videos() == []
+    assert db.get_all_questions() == []
+
+def test_first_run_migrates_json_array(tmp_path):
+    (tmp_path / 'videos.json').write_text('[{"video_id": "v1", "title": "Old"}]')
+    
+    db = Database(tmp_path)
+    
+    assert db.get_video_by_id('v1')['title'] == 'Old'
+    assert Database(tmp_path).get_all_videos() == [{'video_id': 'v1', 'title': 'Old'}]
+
+def test_first_run_starts_empty(db, tmp_path):
+    assert db.get_all_videos() == []
+    assert db.get_all_questions() == []
+    
+    db.add_video({'video_id': 'v1', 'title': 'First'})
+    
+    assert type(db)(tmp_path).get_all_videos() == [{'video_id': 'v1', 'title': 'First'}]
+
+@pytest.mark.parametrize('mmap_min_size', [database.MMAP_MIN_SIZE, 0])
+def test_torn_last_line_is_skipped_and_replaced(tmp_path, monkeypatch, mmap_min_size):
+    monkeypatch.setattr(database, 'MMAP_MIN_SIZE', mmap_min_size)
+    (tmp_path / 'videos.jsonl').write_bytes(b'{"video_id": "v1"}\n{"video_id": "v2"}\n{"video_id": "v')
+    db = Database(tmp_path)
+    
+    assert [video['video_id'] for video in db.get_all_videos()] == ['v1', 'v2']
+    
+    db.add_video({'video_id': 'v3'})
+    
+    content = (tmp_path / 'videos.jsonl').read_bytes()
+    assert content.startswith(b'{"video_id": "v1"}\n{"video_id": "v2"}\n')
+    assert content.count(b'\n') == 3 and content.endswith(b'\n')
+    assert [video['video_id'] for video in Database(tmp_path).get_all_videos()] == ['v1', 'v2', 'v3']
+
+def test_bulk_rolls_back_when_the_block_raises(db, tmp_path):
+    db.add_video({'video_id': 'v1', 'title': 'Old'})
+    
+    with pytest.raises(RuntimeError):
+        with db.bulk():
+            db.add_video({'video_id': 'v2', 'title': 'Added'})
+            db.update_video('v1', {'video_id': 'v1', 'title': 'Changed'})
+            db.add_questions([question('v2', 'a')])
+            raise RuntimeError('abort')
+    
+    for store in (db, type(db)(tmp_path)):
+        assert store.get_all_videos() == [{'video_id': 'v1', 'title': 'Old'}]
+        assert store.get_all_questions() == []
+
+def test_question_ids_are_not_reused_after_delete(db):
+    first = db.add_questions([question('v1', 'a'), question('v2', 'b'), question('v2', 'c')])
+    db.delete_questions_for_video('v2')
+    
+    second = db.add_questions([question('v3', 'd')])
+    
+    assert first == [1, 2, 3]
+    assert second == [4]
+    assert db.get_question_by_id(3) is None
+    assert db.get_question_by_id(4)['question_text'] == 'd'
+
+def test_question_ids_survive_restart(db, tmp_path):
+    db.add_questions([question('v1', 'a'), question('v1', 'b')])
+    db.delete_questions_for_video('v1')
+    
+    assert type(db)(tmp_path).add_questions([question('v1', 'c')]) == [3]
+
+def test_sqlite_rebuilds_questions_table_without_autoincrement(tmp_path):
+    conn = sqlite3.connect(tmp_path / 'learning.db')
+    conn.execute("CREATE TABLE questions (id INTEGER PRIMARY KEY, question_key TEXT NOT NULL UNIQUE, video_id TEXT NOT NULL, json TEXT NOT NULL)")
+    conn.execute("""INSERT INTO questions VALUES (1, '1', 'v1', '{"question_id": 1, "video_id": "v1"}')""")
+    conn.commit()
+    conn.close()
+    
+    db = SQLiteDatabase(tmp_path)
+    
+    assert db.get_question_by_id(1)['video_id'] == 'v1'
+    assert db.add_questions([question('v1', 'a')]) == [2]
+
+def test_update_video_keeps_its_id(db):
+    db.add_video({'video_id': 'v1', 'title': 'Old'})
+    
+    db.update_video('v1', {'video_id': 'v1', 'title': 'New'})
+    with pytest.raises(ValueError):
+        db.update_video('v1', {'video_id': 'v2', 'title': 'Moved'})
+    
+    assert db.get_video_by_id('v1')['title'] == 'New'
+    assert db.get_video_by_id('v2') is None
+
+def test_sqlite_imports_json_lines_only_once(tmp_path):
+    Database(tmp_path).add_video({'video_id': 'old', 'title': 'Old'})
+    
+    db = SQLiteDatabase(tmp_path)
+    assert [video['video_id'] for video in db.get_all_videos()] == ['old']
+    db.delete_video_and_questions('old')
+    
+    assert SQLiteDatabase(tmp_path).get_all_videos() == []
+
+def test_update_video_replaces_the_record_readers_hold(tmp_path):
+    db = Database(tmp_path)
+    db.add_video({'video_id': 'v1', 'title': 'Old'})
+    before = db.get_video_by_id('v1')
+    
+    db.update_video('v1', {'video_id': 'v1', 'title': 'New'})
+    
+    assert before == {'video_id': 'v1', 'title': 'Old'}
+    assert db.get_video_by_id('v1')['title'] == 'New'
+    assert db.get_all_videos() == [{'video_id': 'v1', 'title': 'New'}]
+
+def test_count_questions_by_video(db):
+    db.add_questions([question('v1', 'a'), question('v2', 'b'), question('v2', 'c')])
+    db.delete_questions_for_video('v1')
+    
+    assert db.count_questions_by_video() == {'v2': 2}
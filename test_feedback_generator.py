@@ -1,44 +1,106 @@
 # test_feedback_generator.py
-from app.utils.feedback_generator import FeedbackGenerator
+import orjson
+import pytest
+from app.utils.feedback_generator import ESCALATION_MODEL, FeedbackGenerator
 
-def test_feedback_generation():
-    generator = FeedbackGenerator()
-    
-    # Sample question
-    question = {
-        'question_id': 'test_question',
-        'question_text': 'What is machine learning?',
-        'options': [
-            {'id': 'A', 'text': 'A type of computer hardware'},
-            {'id': 'B', 'text': 'A field of study that gives computers the ability to learn without being explicitly programmed'},
-            {'id': 'C', 'text': 'A programming language'},
-            {'id': 'D', 'text': 'A database management system'}
-        ],
-        'correct_answer': 'B'
-    }
-    
-    # Test correct answer
-    correct_feedback = generator.generate_feedback(
-        question=question,
+# Sample question
+QUESTION = {
+    'question_id': 'test_question',
+    'question_text': 'What is machine learning?',
+    'options': [
+        {'id': 'A', 'text': 'A type of computer hardware'},
+        {'id': 'B', 'text': 'A field of study that gives computers the ability to learn without being explicitly programmed'},
+        {'id': 'C', 'text': 'A programming language'},
+        {'id': 'D', 'text': 'A database management system'}
+    ],
+    'correct_answer': 'B'
+}
+
+EXPLANATION = 'Machine learning is a field of study focused on algorithms that can learn from data.'
+CONTEXT = 'Machine learning is a subfield of artificial intelligence that focuses on developing systems that can learn from data without being explicitly programmed.'
+
+@pytest.fixture
+def generator(completions):
+    return FeedbackGenerator()
+
+def test_correct_answer_feedback(generator, completions):
+    feedback = generator.generate_feedback(
+        question=QUESTION,
         user_answer='B',
-        is_correct=True,
-        original_explanation='Machine learning is a field of study focused on algorithms that can learn from data.',
-        context_text='Machine learning is a subfield of artificial intelligence that focuses on developing systems that can learn from data without being explicitly programmed.'
+        original_explanation=EXPLANATION,
+        context_text=CONTEXT
     )
     
-    # Test incorrect answer
-    incorrect_feedback = generator.generate_feedback(
-        question=question,
+    # Correct answers get the stored explanation without an API call
+    assert completions.requests == []
+    assert feedback['is_correct'] is True
+    assert feedback['explanation'] == EXPLANATION
+    assert feedback['enhanced_feedback']
+    assert feedback['question_id'] == 'test_question'
+
+def test_incorrect_answer_feedback(generator, completions):
+    completions.responses.append(orjson.dumps({
+        'feedback': 'Computer hardware runs machine learning, but machine learning itself is a field of study.',
+        'additional_resources': [{'title': 'Machine learning basics', 'description': 'An introduction'}]
+    }).decode())
+    
+    feedback = generator.generate_feedback(
+        question=QUESTION,
         user_answer='A',
-        is_correct=False,
-        original_explanation='Machine learning is a field of study focused on algorithms that can learn from data.',
-        context_text='Machine learning is a subfield of artificial intelligence that focuses on developing systems that can learn from data without being explicitly programmed.'
+        original_explanation=EXPLANATION,
+        context_text=CONTEXT
     )
     
-    print("Feedback for correct answer:")
-    print(correct_feedback)
-    print("\nFeedback for incorrect answer:")
-    print(incorrect_feedback)
+    assert feedback['is_correct'] is False
+    assert feedback['correct_answer'] == 'B'
+    assert feedback['enhanced_feedback'].startswith('Computer hardware')
+    assert feedback['additional_resources'][0]['title'] == 'Machine learning basics'
 
-if __name__ == "__main__":
-    test_feedback_generation()
\ No newline at end of file
+def test_repeated_answer_is_cached(generator, completions):
+    completions.responses.append(orjson.dumps({
+        'feedback': 'Computer hardware runs machine learning, but machine learning itself is a field of study.'
+    }).decode())
+    first = generator.generate_feedback(QUESTION, 'A', EXPLANATION, CONTEXT)
+    
+    # Answers that only differ in case and whitespace share the cached feedback
+    feedback = generator.generate_feedback(QUESTION, ' a ', EXPLANATION, CONTEXT)
+    
+    assert len(completions.requests) == 1
+    assert feedback == first
+    assert feedback['enhanced_feedback'].startswith('Computer hardware')
+
+def test_borderline_short_answer_is_escalated_on_every_path(generator, completions):
+    question = {
+        'question_id': 'test_short_answer',
+        'type': 'short_answer',
+        'question_text': 'Why does machine learning need data?',
+        'key_points': ['Models learn patterns from data', 'More data improves generalization']
+    }
+    answer = 'Models learn patterns from the data they are trained on, so without data there is nothing to learn'
+    completions.responses.append(orjson.dumps({'score_percentage': 70, 'feedback': 'Cheap model score'}).decode())
+    
+    # Answers sent through the Batch API are finished the same way
+    request = generator.feedback_request(question, answer, EXPLANATION, CONTEXT)
+    completions.responses.append(orjson.dumps({'score_percentage': 85, 'feedback': 'Larger model score'}).decode())
+    feedback = generator.complete_request(request, completions.create(**request['options']).choices[0].message.content)
+    
+    assert [r['model'] for r in completions.requests] == [request['options']['model'], ESCALATION_MODEL]
+    assert feedback['score_percentage'] == 85
+    assert generator.generate_feedback(question, answer, EXPLANATION, CONTEXT) == feedback
+    assert len(completions.requests) == 2
+
+def test_short_paraphrase_is_evaluated(generator, completions):
+    question = {
+        'question_id': 'test_short_paraphrase',
+        'type': 'short_answer',
+        'question_text': 'Why add an index to a database table?',
+        'key_points': ['Indexes make lookups faster']
+    }
+    completions.responses.append(orjson.dumps({'score_percentage': 90, 'feedback': 'Right, reads get faster.'}).decode())
+    
+    feedback = generator.generate_feedback(question, 'it speeds reads up', EXPLANATION)
+    
+    assert len(completions.requests) == 1
+    assert feedback['score_percentage'] == 90
+    assert generator.generate_feedback(question, "I don't know", EXPLANATION)['score_percentage'] == 0
+    assert len(completions.requests) == 1
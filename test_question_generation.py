@@ -1,38 +1,108 @@
 # test_question_generation.py
+import orjson
+import pytest
 from app.utils.question_generator import QuestionGenerator
 
-def test_question_generation():
-    generator = QuestionGenerator()
-    
-    # Sample text from an educational video
-    sample_text = """
-    Machine learning is a subfield of artificial intelligence that focuses on developing systems that can learn from data.
-    Supervised learning is a type of machine learning where models are trained on labeled data.
-    Unsupervised learning, on the other hand, works with unlabeled data to find patterns and structures.
-    The third main category is reinforcement learning, where agents learn to make decisions by receiving rewards or penalties.
-    """
+# Sample text from an educational video
+SAMPLE_TEXT = """
+Machine learning is a subfield of artificial intelligence that focuses on developing systems that can learn from data.
+Supervised learning is a type of machine learning where models are trained on labeled data.
+Unsupervised learning, on the other hand, works with unlabeled data to find patterns and structures.
+The third main category is reinforcement learning, where agents learn to make decisions by receiving rewards or penalties.
+"""
+
+SAMPLE_QUESTION = {
+    "type": "multiple_choice",
+    "question_text": "What kind of data is supervised learning trained on?",
+    "options": [
+        {"id": "A", "text": "Labeled data"},
+        {"id": "B", "text": "Unlabeled data"},
+        {"id": "C", "text": "Rewards and penalties"},
+        {"id": "D", "text": "No data"}
+    ],
+    "correct_answer": "A",
+    "explanation": "Supervised models are trained on labeled data."
+}
+
+@pytest.fixture
+def generator(completions):
+    return QuestionGenerator()
+
+def test_question_generation(generator, completions):
+    completions.responses.append(orjson.dumps({"questions": [SAMPLE_QUESTION, SAMPLE_QUESTION]}).decode())
     
-    # Generate questions
     questions = generator.generate_from_text(
-        text=sample_text,
+        text=SAMPLE_TEXT,
         video_id="test_video_id",
         timestamp_start=10.5,
         timestamp_end=60.2,
         num_questions=2
     )
     
-    # Print the generated questions
-    print(f"Generated {len(questions)} questions:")
-    for i, question in enumerate(questions):
-        print(f"\nQuestion {i+1}:")
-        print(f"ID: {question.get('question_id')}")
-        print(f"Text: {question.get('question_text')}")
-        print("Options:")
-        for option in question.get('options'):
-            print(f"  {option.get('id')}: {option.get('text')}")
-        print(f"Correct Answer: {question.get('correct_answer')}")
-        print(f"Explanation: {question.get('explanation')}")
-        print(f"Timestamp: {question.get('timestamp_start')} - {question.get('timestamp_end')}")
-
-if __name__ == "__main__":
-    test_question_generation()
\ No newline at end of file
+    assert len(questions) == 2
+    for question in questions:
+        # IDs are assigned when questions are saved to the database
+        assert "question_id" not in question
+        assert question["video_id"] == "test_video_id"
+        assert question["type"] == "multiple_choice"
+        assert len(question["options"]) == 4
+        assert question["correct_answer"] == "A"
+        assert (question["timestamp_start"], question["timestamp_end"]) == (10.5, 60.2)
+        assert question["context_text"] == SAMPLE_TEXT
+
+def test_cached_questions_skip_the_api(generator, completions):
+    completions.responses.append(orjson.dumps({"questions": [SAMPLE_QUESTION, SAMPLE_QUESTION]}).decode())
+    generator.generate_from_text(SAMPLE_TEXT, "test_video_id", 10.5, 60.2, num_questions=2)
+    
+    questions = generator.generate_from_text(SAMPLE_TEXT, "other_video_id", 0, 5, num_questions=2)
+    
+    assert len(completions.requests) == 1
+    assert [question["question_text"] for question in questions] == [SAMPLE_QUESTION["question_text"]] * 2
+    # Cached questions get the metadata of the text they are served for
+    assert [question["video_id"] for question in questions] == ["other_video_id", "other_video_id"]
+    assert [question["timestamp_start"] for question in questions] == [0, 0]
+
+def test_batch_generation(generator, completions):
+    chunks = [
+        {"text": "Intro to neural networks", "start_time": 0, "end_time": 30},
+        {"text": "Backpropagation", "start_time": 30, "end_time": 60},
+        {"text": "Intro to neural networks", "start_time": 60, "end_time": 90}
+    ]
+    completions.responses.append(orjson.dumps({"questions": [
+        {**SAMPLE_QUESTION, "chunk_index": 1},
+        {**SAMPLE_QUESTION, "chunk_index": 0}
+    ]}).decode())
+    
+    questions = generator.generate_batch(chunks, "multiple_choice", "test_video_id")
+    
+    # The repeated chunk is only sent once
+    assert completions.requests[-1]["messages"][-1]["content"].count("<chunk ") == 2
+    assert [question["timestamp_start"] for question in questions] == [0, 30, 60]
+    assert "chunk_index" not in questions[0]
+
+def test_batch_chunk_indexes_are_coerced(generator, completions):
+    chunks = [
+        {"text": "Gradient descent", "start_time": 0, "end_time": 30},
+        {"text": "Learning rates", "start_time": 30, "end_time": 60}
+    ]
+    completions.responses.append(orjson.dumps({"questions": [
+        {**SAMPLE_QUESTION, "chunk_index": "1"},
+        {**SAMPLE_QUESTION, "chunk_index": 0.0},
+        {**SAMPLE_QUESTION, "chunk_index": "first"},
+        {**SAMPLE_QUESTION, "chunk_index": None},
+        {**SAMPLE_QUESTION, "chunk_index": 2}
+    ]}).decode())
+    
+    questions = generator.generate_batch(chunks, "multiple_choice", "test_video_id")
+    
+    assert [question["timestamp_start"] for question in questions] == [0, 30]
+
+def test_fallback_questions(generator, completions):
+    completions.responses.append("not json")
+    
+    questions = generator.generate_from_text("Gradient descent", "test_video_id", 5, 10, question_type="fill_in_the_blank")
+    
+    assert len(questions) == 1
+    assert questions[0]["type"] == "fill_in_the_blank"
+    assert (questions[0]["timestamp_start"], questions[0]["timestamp_end"]) == (5, 10)
+    assert questions[0]["context_text"] == "Gradient descent"
@@ -1,38 +1,112 @@
 # test_subtitle_parser.py
+import pytest
 from app.utils.subtitle_parser import SubtitleParser
 
-def test_subtitle_parser():
-    parser = SubtitleParser()
-    
-    # Replace with the path to your test subtitle file
-    test_file = 'path/to/your/test/subtitle.srt'
-    
-    try:
-        segments = parser.parse(test_file)
-        print(f"Successfully parsed {len(segments)} subtitle segments")
-        
-        # Print the first few segments
-        for i, segment in enumerate(segments[:5]):
-            print(f"Segment {i+1}:")
-            print(f"  Text: {segment['text']}")
-            print(f"  Start Time: {segment['start_time_str']} ({segment['start_time']} seconds)")
-            print(f"  End Time: {segment['end_time_str']} ({segment['end_time']} seconds)")
-            print()
-        
-        # Test grouping
-        chunks = parser.group_by_topic(segments)
-        print(f"Grouped into {len(chunks)} topic chunks")
-        
-        # Print the first few chunks
-        for i, chunk in enumerate(chunks[:3]):
-            print(f"Chunk {i+1}:")
-            print(f"  Start: {chunk['start_time']} seconds")
-            print(f"  End: {chunk['end_time']} seconds")
-            print(f"  Text: {chunk['text'][:100]}...")
-            print()
-    
-    except Exception as e:
-        print(f"Error: {str(e)}")
-
-if __name__ == "__main__":
-    test_subtitle_parser()
\ No newline at end of file
+SRT = """1
+00:00:01,000 --> 00:00:04,500
+Welcome to the course.
+
+2
+00:00:04,500 --> 00:00:09,250
+Today we cover supervised learning
+and labeled data.
+
+3
+00:01:02,000 --> 01:00:00,000
+Thanks for watching.
+"""
+
+VTT = """WEBVTT
+
+00:00:01.000 --> 00:00:04.500
+Welcome to the course.
+
+00:04.500 --> 00:09.250
+Today we cover supervised learning.
+"""
+
+@pytest.fixture(scope="module")
+def parser():
+    return SubtitleParser()
+
+@pytest.fixture(scope="module")
+def subtitle_files(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("subtitles")
+    (directory / "lecture.srt").write_text(SRT, encoding="utf-8")
+    (directory / "lecture.vtt").write_text(VTT, encoding="utf-8")
+    return directory
+
+def test_parse_srt(parser, subtitle_files):
+    segments = parser.parse(subtitle_files / "lecture.srt")
+    
+    assert [segment['index'] for segment in segments] == [1, 2, 3]
+    assert segments[1]['text'] == "Today we cover supervised learning\nand labeled data."
+    assert segments[1]['start_time'] == 4.5
+    assert segments[1]['start_time_str'] == "00:00:04,500"
+    assert segments[2]['end_time'] == 3600.0
+
+def test_parse_vtt(parser, subtitle_files):
+    segments = parser.parse(subtitle_files / "lecture.vtt")
+    
+    assert [segment['index'] for segment in segments] == [1, 2]
+    assert (segments[0]['start_time'], segments[0]['end_time']) == (1.0, 4.5)
+    assert (segments[1]['start_time'], segments[1]['end_time']) == (4.5, 9.25)
+
+def test_unsupported_format(parser):
+    with pytest.raises(ValueError):
+        parser.parse("lecture.ass")
+
+def test_group_by_topic(parser, subtitle_files):
+    chunks = parser.group_by_topic(parser.iter_parse(subtitle_files / "lecture.srt"), window_size=2)
+    
+    assert len(chunks) == 2
+    assert (chunks[0]['start_time'], chunks[0]['end_time']) == (1.0, 9.25)
+    assert chunks[0]['text'] == "Welcome to the course. Today we cover supervised learning\nand labeled data."
+    assert chunks[1]['start_index'] == chunks[1]['end_index'] == 3
+
+def test_parse_srt_skips_malformed_cues(parser, tmp_path):
+    path = tmp_path / "malformed.srt"
+    path.write_text(
+        "1\n00:00:01,000 --> 00:00:02,000\nKept.\n\n"
+        "2\n00:00:03 --> 00:00:04,000\nNo milliseconds.\n\n"
+        "3\n00:61:00,000 --> 00:62:00,000\nMinutes out of range.\n\n"
+        "4\n00:00:09,000 --> 00:00:08,000\nEnds before it starts.\n\n"
+        "5\n00:00:10,250 --> 00:00:11,000 X1:10 X2:20\nAlso kept.\n",
+        encoding="utf-8"
+    )
+    
+    segments = parser.parse(path)
+    
+    assert [segment['index'] for segment in segments] == [1, 5]
+    assert [segment['text'] for segment in segments] == ["Kept.", "Also kept."]
+    assert segments[1]['start_time'] == 10.25
+
+def test_parse_srt_rejects_invalid_utf8(parser, tmp_path):
+    path = tmp_path / "latin1.srt"
+    path.write_bytes("1\n00:00:01,000 --> 00:00:02,000\nCafé\n".encode("latin-1"))
+    
+    with pytest.raises(UnicodeDecodeError):
+        parser.parse(path)
+
+def test_parse_srt_accepts_pysrt_timings(parser, tmp_path):
+    path = tmp_path / "loose.srt"
+    path.write_text(
+        "1\n0:00:03,000 --> 0:00:04.5\nSingle digit hours.\n\n"
+        "2\n00:00:05.250 --> 00:00:06,000\nDot separator.\n",
+        encoding="utf-8"
+    )
+    
+    segments = parser.parse(path)
+    
+    assert [(segment['start_time'], segment['end_time']) for segment in segments] == [(3.0, 4.5), (5.25, 6.0)]
+    assert segments[0]['end_time_str'] == "00:00:04,500"
+
+def test_parse_srt_without_valid_cues_raises(parser, tmp_path):
+    path = tmp_path / "broken.srt"
+    path.write_text("1\n00:00:03 --> 00:00:04\nNo milliseconds.\n", encoding="utf-8")
+    
+    with pytest.raises(ValueError):
+        parser.parse(path)
+    
+    (tmp_path / "empty.srt").write_text("\n", encoding="utf-8")
+    assert parser.parse(tmp_path / "empty.srt") == []